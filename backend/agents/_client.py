@@ -0,0 +1,25 @@
+# backend/agents/_client.py
+"""
+Shared OpenAI client for all agents
+One pooled HTTP client keeps connections warm across agents and requests
+instead of every agent paying its own TCP/TLS handshakes; HTTP/2 lets
+concurrent requests share a single connection
+"""
+
+import httpx
+from openai import AsyncOpenAI
+
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config.settings import settings
+
+# Connection pool shared by every OpenAI request in the process
+http_client = httpx.AsyncClient(
+    http2=True,
+    limits=httpx.Limits(max_connections=100, max_keepalive_connections=50),
+    timeout=60
+)
+
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=http_client)
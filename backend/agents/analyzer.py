@@ -4,10 +4,35 @@ Analyzer Agent: Synthesizes and analyzes information from the Researcher
 This agent uses GPT-4 to understand, evaluate, and extract insights
 """
 
-from typing import Dict, List, Any
-from openai import OpenAI
-from datetime import datetime
-import json
+from typing import Dict, List, Any, Optional, Tuple, TYPE_CHECKING
+import asyncio
+import orjson
+import re
+import time
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Make the backend root importable when run directly
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from cache import cached_completion, semantic_cache
+
+# Section separator used in the hand-off to the Writer
+_SEP = "=" * 50
+
+# Locate the KEY FINDINGS section of a free-text analysis. It ends at a
+# paragraph break or at the next heading: markdown ("## ..."), numbered as in
+# the prompt ("2. PATTERNS: ...") or a bare capitalized label ("PATTERNS:")
+_KEY_SECTION_RE = re.compile(
+    r"(?:KEY FINDINGS|Key Findings)[:*\n]+(.*?)"
+    r"(?=\n\n[A-Z#*]|\n[ \t]*(?:#|\d+[.)][ \t]*[A-Z][A-Z &/-]*:|[A-Z][A-Z &/-]+:)|\Z)",
+    re.DOTALL
+)
+# Bullet markers; a number is only a marker when followed by "." or ")" and a space
+_BULLET_RE = re.compile(r"^\s*(?:[•\-\*]+\s*|\d+[.)]\s+)")
 
 class AnalyzerAgent:
     """
@@ -15,16 +40,25 @@ class AnalyzerAgent:
     It's like having a data analyst who can quickly understand and summarize findings.
     """
     
-    def __init__(self, openai_api_key: str, model: str = "gpt-4o-mini"):
+    def __init__(self, openai_api_key: str, model: str = "gpt-4o-mini", max_concurrency: int = 10,
+                 client: Optional["AsyncOpenAI"] = None):
         """
         Initialize the Analyzer with OpenAI client
         
         Args:
             openai_api_key: API key for OpenAI
             model: Which GPT model to use
+            max_concurrency: Maximum number of in-flight OpenAI requests
+            client: Shared AsyncOpenAI client to reuse (created from the key if omitted)
         """
-        self.client = OpenAI(api_key=openai_api_key)
+        if client is None:
+            # Imported here so loading the module doesn't pull in the SDK
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(api_key=openai_api_key)
+        self.client = client
         self.model = model
+        # Cap concurrent calls to stay within OpenAI rate limits
+        self.semaphore = asyncio.Semaphore(max_concurrency)
         self.name = "Analyzer Agent 🧠"
         
         # System prompt that defines how the analyzer should think
@@ -36,9 +70,12 @@ class AnalyzerAgent:
 5. Identify any gaps or contradictions in the information
 
 Provide a structured analysis that will help create a comprehensive report.
-Be critical and analytical, not just summarizing."""
+Be critical and analytical, not just summarizing.
+
+Alongside the analysis, extract 5-7 concise key bullet points of the findings.
+Always respond with a JSON object."""
     
-    def analyze(self, search_results: str, original_query: str) -> Dict[str, Any]:
+    async def analyze(self, search_results: str, original_query: str) -> Dict[str, Any]:
         """
         Analyze the search results and extract insights
         
@@ -52,46 +89,34 @@ Be critical and analytical, not just summarizing."""
         print(f"\n{self.name} starting analysis...")
         
         try:
-            # Create the analysis prompt
-            user_prompt = f"""
-Research Question: {original_query}
-
-Search Results to Analyze:
-{search_results}
-
-Please provide a comprehensive analysis including:
-1. KEY FINDINGS: Main discoveries from the sources
-2. PATTERNS: Common themes across sources
-3. CREDIBILITY: Assessment of source reliability
-4. INSIGHTS: Deeper insights beyond surface-level information
-5. GAPS: What information is missing or unclear
-6. SYNTHESIS: Overall synthesis connecting all findings
-"""
+            # Reuse the analysis of a near-identical earlier query
+            query_embedding = await semantic_cache.embed(self.client, original_query)
+            if query_embedding is not None:
+                cached = semantic_cache.lookup("analysis", query_embedding)
+                if cached is not None:
+                    print(f"✅ {self.name} reused a cached analysis")
+                    return {
+                        **cached,
+                        "original_query": original_query,
+                        "timestamp": time.time(),
+                        "tokens_used": 0
+                    }
             
-            # Call GPT-4 for analysis
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,  # Some creativity but mostly factual
-                max_tokens=1500
-            )
+            # Call GPT-4 once for both the analysis and the key points
+            async with self.semaphore:
+                content, tokens_used = await cached_completion(
+                    self.client,
+                    **self.build_request(search_results, original_query)
+                )
             
-            analysis = response.choices[0].message.content
+            result = self.parse_analysis(content, original_query, tokens_used)
             
             print(f"✅ {self.name} completed analysis")
             
-            return {
-                "status": "success",
-                "original_query": original_query,
-                "analysis": analysis,
-                "model_used": self.model,
-                "timestamp": datetime.now().isoformat(),
-                "agent": self.name,
-                "tokens_used": response.usage.total_tokens
-            }
+            if query_embedding is not None:
+                semantic_cache.insert("analysis", query_embedding, result)
+            
+            return result
             
         except Exception as e:
             error_msg = f"Analysis failed: {str(e)}"
@@ -101,13 +126,177 @@ Please provide a comprehensive analysis including:
                 "status": "error",
                 "original_query": original_query,
                 "error": error_msg,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": time.time(),
                 "agent": self.name
             }
     
+    def build_request(self, search_results: str, original_query: str) -> Dict[str, Any]:
+        """
+        Chat completion parameters for analyzing one query's search results
+        Shared by analyze and the Batch API path
+        
+        Args:
+            search_results: Formatted results from the Researcher agent
+            original_query: The original research question
+            
+        Returns:
+            Keyword arguments for chat.completions.create
+        """
+        # Static instructions first and the research data last, so the
+        # prompt prefix is identical across requests (OpenAI prompt caching)
+        user_prompt = f"""
+Please provide a comprehensive analysis of the search results below, including:
+1. KEY FINDINGS: Main discoveries from the sources
+2. PATTERNS: Common themes across sources
+3. CREDIBILITY: Assessment of source reliability
+4. INSIGHTS: Deeper insights beyond surface-level information
+5. GAPS: What information is missing or unclear
+6. SYNTHESIS: Overall synthesis connecting all findings
+
+Return JSON with keys `analysis` (string containing the full analysis above)
+and `key_points` (array of 5-7 strings).
+
+Research Question: {original_query}
+
+Search Results to Analyze:
+{search_results}
+"""
+
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": 0.7,  # Some creativity but mostly factual
+            "max_tokens": 1700,
+            "response_format": {"type": "json_object"}
+        }
+    
+    def parse_analysis(self, content: str, original_query: str, tokens_used: int) -> Dict[str, Any]:
+        """
+        Turn the model's JSON reply into an analysis result
+        
+        Args:
+            content: JSON text returned for a build_request call
+            original_query: The original research question
+            tokens_used: Tokens the call consumed
+            
+        Returns:
+            Dictionary containing analysis and insights
+        """
+        parsed = orjson.loads(content)
+        analysis = parsed.get("analysis", "")
+        if not isinstance(analysis, str):
+            # The model occasionally nests the sections as an object
+            analysis = orjson.dumps(analysis, option=orjson.OPT_INDENT_2).decode()
+        
+        return {
+            "status": "success",
+            "original_query": original_query,
+            "analysis": analysis,
+            "key_points": [str(point).strip() for point in parsed.get("key_points", [])],
+            "model_used": self.model,
+            "timestamp": time.time(),
+            "agent": self.name,
+            "tokens_used": tokens_used
+        }
+    
+    async def analyze_batch(self, items: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Analyze several (search_results, query) pairs in a single GPT call
+        The system prompt and instructions are sent once for the whole batch,
+        saving a round trip per extra query
+        
+        Args:
+            items: List of (search_results, original_query) tuples
+            
+        Returns:
+            List of analysis dictionaries aligned with items
+        """
+        if not items:
+            return []
+        if len(items) == 1:
+            return [await self.analyze(*items[0])]
+        
+        print(f"\n{self.name} starting batch analysis of {len(items)} queries...")
+        
+        sections = [
+            f"Q{i}: {query}\nResults {i}:\n{search_results}"
+            for i, (search_results, query) in enumerate(items, 1)
+        ]
+        user_prompt = f"""
+For EACH numbered research question below, provide a comprehensive analysis of
+its search results, including:
+1. KEY FINDINGS: Main discoveries from the sources
+2. PATTERNS: Common themes across sources
+3. CREDIBILITY: Assessment of source reliability
+4. INSIGHTS: Deeper insights beyond surface-level information
+5. GAPS: What information is missing or unclear
+6. SYNTHESIS: Overall synthesis connecting all findings
+
+Return a JSON object keyed by question number ("1", "2", ...). Each value is an
+object with keys `analysis` (string) and `key_points` (array of 5-7 strings).
+
+""" + "\n\n".join(sections)
+        
+        error_msg = None
+        try:
+            async with self.semaphore:
+                content, tokens_used = await cached_completion(
+                    self.client,
+                    self.model,
+                    [
+                        {"role": "system", "content": self.system_prompt},
+                        {"role": "user", "content": user_prompt}
+                    ],
+                    temperature=0.7,
+                    max_tokens=min(1700 * len(items), 16000),
+                    response_format={"type": "json_object"}
+                )
+            parsed = orjson.loads(content)
+            print(f"✅ {self.name} completed batch analysis")
+        except Exception as e:
+            error_msg = f"Analysis failed: {str(e)}"
+            print(f"❌ {self.name} error: {error_msg}")
+            parsed = {}
+            tokens_used = 0
+        
+        timestamp = time.time()  # Epoch seconds, shared by every item
+        results = []
+        for i, (_, query) in enumerate(items, 1):
+            entry = parsed.get(str(i))
+            if not isinstance(entry, dict):
+                results.append({
+                    "status": "error",
+                    "original_query": query,
+                    "error": error_msg or f"Analysis failed: no result for question {i}",
+                    "timestamp": timestamp,
+                    "agent": self.name
+                })
+                continue
+            
+            analysis = entry.get("analysis", "")
+            if not isinstance(analysis, str):
+                analysis = orjson.dumps(analysis, option=orjson.OPT_INDENT_2).decode()
+            results.append({
+                "status": "success",
+                "original_query": query,
+                "analysis": analysis,
+                "key_points": [str(point).strip() for point in entry.get("key_points", [])],
+                "model_used": self.model,
+                "timestamp": timestamp,
+                "agent": self.name,
+                # One call served the whole batch, split its cost evenly
+                "tokens_used": tokens_used // len(items)
+            })
+        
+        return results
+    
     def extract_key_points(self, analysis_results: Dict) -> List[str]:
         """
         Extract bullet points of key findings for the report
+        (returned by analyze, or parsed from the analysis text; never an API call)
         
         Args:
             analysis_results: Results from the analyze method
@@ -118,30 +307,21 @@ Please provide a comprehensive analysis including:
         if analysis_results["status"] == "error":
             return [f"Analysis failed: {analysis_results['error']}"]
         
-        # Use GPT to extract key points in bullet form
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "Extract 5-7 key bullet points from this analysis. Be concise."},
-                    {"role": "user", "content": analysis_results["analysis"]}
-                ],
-                temperature=0.3,  # Low temperature for consistency
-                max_tokens=300
-            )
-            
-            # Split response into bullet points
-            key_points = [
-                point.strip().lstrip("•-*").strip() 
-                for point in response.choices[0].message.content.split("\n") 
-                if point.strip()
-            ]
-            
-            return key_points
-            
-        except Exception as e:
-            print(f"Failed to extract key points: {e}")
-            return ["Error extracting key points"]
+        # Key points are normally produced by the same call as the analysis
+        if analysis_results.get("key_points"):
+            return analysis_results["key_points"]
+        
+        # Otherwise parse the KEY FINDINGS section of the analysis text
+        match = _KEY_SECTION_RE.search(analysis_results.get("analysis", ""))
+        if not match:
+            return []
+        
+        key_points = []
+        for line in match.group(1).split("\n"):
+            point = _BULLET_RE.sub("", line).strip()
+            if point:
+                key_points.append(point)
+        return key_points
     
     def format_for_next_agent(self, analysis_results: Dict) -> str:
         """
@@ -156,15 +336,19 @@ Please provide a comprehensive analysis including:
         if analysis_results["status"] == "error":
             return f"Analysis failed: {analysis_results['error']}"
         
-        formatted = f"RESEARCH QUESTION: {analysis_results['original_query']}\n\n"
-        formatted += "ANALYSIS RESULTS:\n"
-        formatted += "=" * 50 + "\n\n"
-        formatted += analysis_results["analysis"]
-        formatted += "\n\n" + "=" * 50
-        formatted += f"\n\nAnalyzed by: {analysis_results['agent']}"
-        formatted += f"\nTokens used: {analysis_results.get('tokens_used', 'N/A')}"
+        parts: List[str] = [
+            f"RESEARCH QUESTION: {analysis_results['original_query']}\n\n",
+            "ANALYSIS RESULTS:\n",
+            _SEP,
+            "\n\n",
+            analysis_results["analysis"],
+            "\n\n",
+            _SEP,
+            f"\n\nAnalyzed by: {analysis_results['agent']}",
+            f"\nTokens used: {analysis_results.get('tokens_used', 'N/A')}",
+        ]
         
-        return formatted
+        return "".join(parts)
 
 
 # Example usage and testing
@@ -212,10 +396,10 @@ Relevance Score: 0.88
     print("🧪 Testing Analyzer Agent")
     
     # Perform analysis
-    results = analyzer.analyze(
+    results = asyncio.run(analyzer.analyze(
         sample_search_results,
         "What are the latest advances in LangGraph for multi-agent systems?"
-    )
+    ))
     
     # Print results
     if results["status"] == "success":
@@ -5,9 +5,19 @@ This agent uses Tavily API to find relevant, up-to-date information
 """
 
 from typing import Dict, List, Any
-from tavily import TavilyClient
-from datetime import datetime
-import json
+import orjson
+import time
+
+# Separator between sources in the hand-off to the Analyzer
+_SOURCE_SEP = "-" * 50 + "\n"
+
+# Tavily search options shared by search and asearch
+_SEARCH_OPTIONS = {
+    "include_answer": True,  # Get a quick answer if available
+    "include_raw_content": False,  # We don't need the full HTML
+    "include_images": False,  # Skip images for now
+    "search_depth": "advanced"  # Use advanced search for better results
+}
 
 class ResearcherAgent:
     """
@@ -15,14 +25,23 @@ class ResearcherAgent:
     It's like having a research assistant who knows how to find the best sources.
     """
     
-    def __init__(self, tavily_api_key: str):
+    def __init__(self, tavily_api_key: str, client=None, async_client=None):
         """
-        Initialize the Researcher with Tavily client
+        Initialize the Researcher with Tavily clients
         
         Args:
             tavily_api_key: API key for Tavily search service
+            client: Existing TavilyClient to reuse (created from the key if omitted)
+            async_client: Existing AsyncTavilyClient to reuse (created if omitted)
         """
-        self.client = TavilyClient(api_key=tavily_api_key)
+        # Imported here so loading the module doesn't pull in the SDK
+        from tavily import AsyncTavilyClient, TavilyClient
+        if client is None:
+            client = TavilyClient(api_key=tavily_api_key)
+        if async_client is None:
+            async_client = AsyncTavilyClient(api_key=tavily_api_key)
+        self.client = client
+        self.async_client = async_client
         self.name = "Researcher Agent 🔍"
     
     def search(self, query: str, max_results: int = 5) -> Dict[str, Any]:
@@ -43,36 +62,60 @@ class ResearcherAgent:
             response = self.client.search(
                 query=query,
                 max_results=max_results,
-                include_answer=True,  # Get a quick answer if available
-                include_raw_content=False,  # We don't need the full HTML
-                include_images=False,  # Skip images for now
-                search_depth="advanced"  # Use advanced search for better results
+                **_SEARCH_OPTIONS
             )
-            
-            # Process and structure the results
-            results = self._process_results(response)
-            
-            print(f"✅ {self.name} found {len(results['sources'])} relevant sources")
-            
-            return {
-                "status": "success",
-                "query": query,
-                "results": results,
-                "timestamp": datetime.now().isoformat(),
-                "agent": self.name
-            }
+            return self._search_result(query, response)
             
         except Exception as e:
-            error_msg = f"Search failed: {str(e)}"
-            print(f"❌ {self.name} error: {error_msg}")
+            return self._search_error(query, e)
+    
+    async def asearch(self, query: str, max_results: int = 5) -> Dict[str, Any]:
+        """
+        Search the web without blocking the event loop
+        Tavily returns each source's content with the results, so this is a
+        single request; there are no per-source page fetches to parallelize
+        Same arguments and return value as search
+        """
+        print(f"\n{self.name} starting search for: '{query}'")
+        
+        try:
+            response = await self.async_client.search(
+                query=query,
+                max_results=max_results,
+                **_SEARCH_OPTIONS
+            )
+            return self._search_result(query, response)
             
-            return {
-                "status": "error",
-                "query": query,
-                "error": error_msg,
-                "timestamp": datetime.now().isoformat(),
-                "agent": self.name
-            }
+        except Exception as e:
+            return self._search_error(query, e)
+    
+    def _search_result(self, query: str, response: Dict) -> Dict[str, Any]:
+        """Wrap a successful Tavily response"""
+        # Process and structure the results
+        results = self._process_results(response)
+        
+        print(f"✅ {self.name} found {len(results['sources'])} relevant sources")
+        
+        return {
+            "status": "success",
+            "query": query,
+            "results": results,
+            "timestamp": time.time(),
+            "agent": self.name
+        }
+    
+    def _search_error(self, query: str, e: Exception) -> Dict[str, Any]:
+        """Wrap a failed search"""
+        error_msg = f"Search failed: {str(e)}"
+        print(f"❌ {self.name} error: {error_msg}")
+        
+        return {
+            "status": "error",
+            "query": query,
+            "error": error_msg,
+            "timestamp": time.time(),
+            "agent": self.name
+        }
     
     def _process_results(self, response: Dict) -> Dict[str, Any]:
         """
@@ -92,10 +135,12 @@ class ResearcherAgent:
         
         # Process each search result
         for result in response.get("results", []):
+            content = result.get("content", "")
             source = {
                 "title": result.get("title", ""),
                 "url": result.get("url", ""),
-                "content": result.get("content", ""),
+                "content": content,
+                "content_short": content[:500],  # Truncated once for the next agent
                 "score": result.get("score", 0),  # Relevance score
                 "published_date": result.get("published_date", "")
             }
@@ -120,23 +165,26 @@ class ResearcherAgent:
             return f"Search failed: {search_results['error']}"
         
         results = search_results["results"]
-        formatted = f"SEARCH QUERY: {search_results['query']}\n\n"
+        parts: List[str] = [f"SEARCH QUERY: {search_results['query']}\n\n"]
         
         # Add quick answer if available
         if results.get("answer"):
-            formatted += f"QUICK ANSWER:\n{results['answer']}\n\n"
+            parts.append(f"QUICK ANSWER:\n{results['answer']}\n\n")
         
         # Add sources
-        formatted += f"SOURCES FOUND ({len(results['sources'])}):\n\n"
+        parts.append(f"SOURCES FOUND ({len(results['sources'])}):\n\n")
         
         for i, source in enumerate(results["sources"], 1):
-            formatted += f"Source {i}: {source['title']}\n"
-            formatted += f"URL: {source['url']}\n"
-            formatted += f"Content: {source['content'][:500]}...\n"  # Truncate long content
-            formatted += f"Relevance Score: {source['score']:.2f}\n"
-            formatted += "-" * 50 + "\n"
+            parts.extend([
+                f"Source {i}: {source['title']}\n",
+                f"URL: {source['url']}\n",
+                # Content was truncated once in _process_results
+                f"Content: {source.get('content_short', source['content'][:500])}...\n",
+                f"Relevance Score: {source['score']:.2f}\n",
+                _SOURCE_SEP,
+            ])
         
-        return formatted
+        return "".join(parts)
 
 
 # Example usage and testing
@@ -166,7 +214,7 @@ if __name__ == "__main__":
     # Print results
     if results["status"] == "success":
         print("\n📊 Search Results:")
-        print(json.dumps(results, indent=2, default=str)[:1000])  # Print first 1000 chars
+        print(orjson.dumps(results, option=orjson.OPT_INDENT_2, default=str).decode()[:1000])  # Print first 1000 chars
         
         print("\n📝 Formatted for next agent:")
         formatted = researcher.format_for_next_agent(results)
@@ -4,10 +4,171 @@ Writer Agent: Creates professional research reports from analyzed data
 This agent uses GPT-4 to generate well-structured, readable reports
 """
 
-from typing import Dict, Any, Optional
-from openai import OpenAI
-from datetime import datetime
-import json
+from typing import Dict, List, Any, Optional, AsyncIterator, Callable, Tuple, TYPE_CHECKING
+import asyncio
+import orjson
+import re
+import time
+
+import mistune
+
+if TYPE_CHECKING:
+    from openai import AsyncOpenAI
+
+# Make the backend root importable when run directly
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from cache import cached_completion, response_cache, semantic_cache
+
+# How long to buffer streamed tokens before flushing them as one chunk (seconds)
+STREAM_FLUSH_INTERVAL = 0.05
+
+# Start of the "report" string in the fused call's JSON response
+_REPORT_FIELD_RE = re.compile(r'"report"\s*:\s*"')
+
+# Markdown renderer and plain-text stripper for export_report, built once
+_MARKDOWN = mistune.create_markdown(escape=False)
+_MD_STRIP = re.compile(r"[#*`]")
+
+# Report prompt templates, built once at import.
+# Static instructions come first so every request of the same type shares an
+# identical prefix that OpenAI can serve from its prompt cache; the
+# request-specific data goes last.
+_DATA_SECTION = """
+Research Question: {query}
+
+Search Results:
+{sr}
+
+Analysis:
+{analysis}
+"""
+
+_DETAILED_TMPL = """
+Using the research data at the end of this message, please create a DETAILED research report with the following sections:
+
+# Research Report: [Title based on query]
+
+## Executive Summary
+[2-3 paragraph overview of key findings]
+
+## Introduction
+[Context and importance of the research question]
+
+## Methodology
+[Brief description of search and analysis approach]
+
+## Key Findings
+[Detailed findings with subsections as needed]
+
+## Analysis & Insights
+[Deeper analysis of the findings]
+
+## Implications
+[What these findings mean]
+
+## Recommendations
+[Actionable recommendations based on findings]
+
+## Conclusion
+[Summary and final thoughts]
+
+## Sources
+[List key sources used]
+""" + _DATA_SECTION
+
+_SUMMARY_TMPL = """
+Using the research data at the end of this message, please create a SUMMARY report (1 page) with:
+
+# [Title]
+## Quick Summary
+## Key Findings (bullet points)
+## Main Insights
+## Recommendations
+## Sources
+""" + _DATA_SECTION
+
+_EXEC_TMPL = """
+Using the research data at the end of this message, please create an EXECUTIVE BRIEF (very concise) with:
+
+# Executive Brief: [Title]
+## The Bottom Line (1 paragraph)
+## Three Key Points
+## Recommended Action
+""" + _DATA_SECTION
+
+_TEMPLATES = {
+    "detailed": _DETAILED_TMPL,
+    "summary": _SUMMARY_TMPL,
+    "executive": _EXEC_TMPL,
+}
+
+class _ReportFieldStream:
+    """
+    Decodes the "report" string of a JSON response while the response is
+    still being streamed, so the fused call can stream its report text.
+    Only the not yet consumed end of the response is kept, so every token
+    costs the same however long the response gets.
+    """
+    
+    # Response text kept while looking for the start of the report field
+    SEARCH_WINDOW = 64
+    
+    def __init__(self):
+        self.pending = ""  # Received text not consumed yet
+        self.started = False  # Whether pending is inside the report string
+        self.done = False
+    
+    def feed(self, token: str) -> str:
+        """Add streamed response text and return the report text it completes"""
+        if self.done:
+            return ""
+        self.pending += token
+        if not self.started:
+            match = _REPORT_FIELD_RE.search(self.pending)
+            if match is None:
+                # Keep enough for a field name split across tokens
+                self.pending = self.pending[-self.SEARCH_WINDOW:]
+                return ""
+            self.started = True
+            self.pending = self.pending[match.end():]
+        
+        raw = self.pending
+        i = 0
+        try:
+            # Advance over whole characters, stopping before an escape
+            # sequence that hasn't fully arrived yet
+            while i < len(raw):
+                char = raw[i]
+                if char == '"':
+                    self.done = True
+                    break
+                if char != "\\":
+                    i += 1
+                    continue
+                if i + 1 >= len(raw):
+                    break
+                if raw[i + 1] != "u":
+                    i += 2
+                    continue
+                if i + 6 > len(raw):
+                    break
+                # A high surrogate is only decodable with the low one after it
+                width = 12 if 0xD800 <= int(raw[i + 2:i + 6], 16) < 0xDC00 else 6
+                if i + width > len(raw):
+                    break
+                i += width
+            
+            text = orjson.loads(f'"{raw[:i]}"') if i else ""
+        except ValueError:
+            # Not the JSON we expected; the caller sends the report afterwards
+            self.done = True
+            return ""
+        self.pending = raw[i:]
+        return text
+
 
 class WriterAgent:
     """
@@ -15,16 +176,25 @@ class WriterAgent:
     It's like having a technical writer who can create clear, structured documents.
     """
     
-    def __init__(self, openai_api_key: str, model: str = "gpt-4o-mini"):
+    def __init__(self, openai_api_key: str, model: str = "gpt-4o-mini", max_concurrency: int = 10,
+                 client: Optional["AsyncOpenAI"] = None):
         """
         Initialize the Writer with OpenAI client
         
         Args:
             openai_api_key: API key for OpenAI
             model: Which GPT model to use
+            max_concurrency: Maximum number of in-flight OpenAI requests
+            client: Shared AsyncOpenAI client to reuse (created from the key if omitted)
         """
-        self.client = OpenAI(api_key=openai_api_key)
+        if client is None:
+            # Imported here so loading the module doesn't pull in the SDK
+            from openai import AsyncOpenAI
+            client = AsyncOpenAI(api_key=openai_api_key)
+        self.client = client
         self.model = model
+        # Cap concurrent calls to stay within OpenAI rate limits
+        self.semaphore = asyncio.Semaphore(max_concurrency)
         self.name = "Writer Agent ✍️"
         
         # System prompt for report writing
@@ -43,12 +213,21 @@ Use markdown formatting including:
 - Bold for emphasis
 - Numbered lists when appropriate
 - Block quotes for important insights"""
+        
+        # System prompt for the single-call analyze + write path
+        self.fused_system_prompt = self.system_prompt + """
+
+Before writing, act as an expert research analyst: synthesize the sources,
+identify key themes and patterns, evaluate source credibility, and note any
+gaps or contradictions. Base the report on that analysis.
+Always respond with a JSON object."""
     
-    def write_report(self, 
+    async def write_report(self, 
                     query: str, 
                     search_results: str, 
                     analysis: str,
-                    report_type: str = "detailed") -> Dict[str, Any]:
+                    report_type: str = "detailed",
+                    on_chunk: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
         """
         Generate a research report from search results and analysis
         
@@ -57,6 +236,8 @@ Use markdown formatting including:
             search_results: Formatted results from Researcher
             analysis: Analysis from Analyzer agent
             report_type: "detailed", "summary", or "executive"
+            on_chunk: If given, the report is streamed and each chunk of text
+                is passed to it as soon as it is generated
             
         Returns:
             Dictionary containing the report and metadata
@@ -64,38 +245,170 @@ Use markdown formatting including:
         print(f"\n{self.name} generating {report_type} report...")
         
         try:
-            # Create the report generation prompt
-            user_prompt = self._create_report_prompt(
-                query, search_results, analysis, report_type
-            )
+            # Reuse the report for a near-identical earlier query
+            namespace = f"report:{report_type}"
+            query_embedding = await semantic_cache.embed(self.client, query)
+            if query_embedding is not None:
+                cached = semantic_cache.lookup(namespace, query_embedding)
+                if cached is not None:
+                    print(f"✅ {self.name} reused a cached {report_type} report")
+                    if on_chunk is not None:
+                        on_chunk(cached["report"])
+                    return {
+                        **cached,
+                        "query": query,
+                        "timestamp": time.time(),
+                        "tokens_used": 0
+                    }
             
-            # Generate the report
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": self.system_prompt},
-                    {"role": "user", "content": user_prompt}
-                ],
-                temperature=0.7,
-                max_tokens=2000
-            )
-            
-            report = response.choices[0].message.content
+            if on_chunk is not None:
+                parts = []
+                usage = {}
+                async for chunk in self.stream_report(
+                    query, search_results, analysis, report_type, usage=usage
+                ):
+                    parts.append(chunk)
+                    on_chunk(chunk)
+                report = "".join(parts)
+                tokens_used = usage.get("total_tokens", 0)
+            else:
+                # Generate the report
+                async with self.semaphore:
+                    report, tokens_used = await cached_completion(
+                        self.client,
+                        **self.build_request(query, search_results, analysis, report_type)
+                    )
             
             print(f"✅ {self.name} completed report generation")
             
+            result = self.report_result(query, report, report_type, tokens_used)
+            
+            if query_embedding is not None:
+                semantic_cache.insert(namespace, query_embedding, result)
+            
+            return result
+            
+        except Exception as e:
+            error_msg = f"Report generation failed: {str(e)}"
+            print(f"❌ {self.name} error: {error_msg}")
+            
             return {
+                "status": "error",
+                "query": query,
+                "error": error_msg,
+                "timestamp": time.time(),
+                "agent": self.name
+            }
+    
+    async def analyze_and_write(self, 
+                                query: str, 
+                                search_results: str,
+                                report_type: str = "summary",
+                                on_chunk: Optional[Callable[[str], None]] = None) -> Dict[str, Any]:
+        """
+        Analyze the search results and write the report in a single GPT call
+        Used for short reports where the intermediate analysis isn't shown,
+        saving a round trip and re-sending the analysis to the model
+        
+        Args:
+            query: Original research question
+            search_results: Formatted results from Researcher
+            report_type: "detailed", "summary", or "executive"
+            on_chunk: If given, the response is streamed and each chunk of the
+                report text is passed to it as soon as it is generated
+            
+        Returns:
+            Dictionary containing the report, analysis, title, key points and metadata
+        """
+        print(f"\n{self.name} analyzing and generating {report_type} report...")
+        
+        try:
+            # Reuse the result for a near-identical earlier query
+            namespace = f"fused:{report_type}"
+            query_embedding = await semantic_cache.embed(self.client, query)
+            if query_embedding is not None:
+                cached = semantic_cache.lookup(namespace, query_embedding)
+                if cached is not None:
+                    print(f"✅ {self.name} reused a cached {report_type} report")
+                    if on_chunk is not None:
+                        on_chunk(cached["report"])
+                    return {
+                        **cached,
+                        "query": query,
+                        "timestamp": time.time(),
+                        "tokens_used": 0
+                    }
+            
+            # JSON instructions are static, so they go before the report prompt
+            user_prompt = """
+Return JSON with keys `analysis` (string: your critical analysis of the sources),
+`report` (string: the Markdown report described below), `title` (string: maximum
+10 words) and `key_points` (array of 5-7 strings).
+""" + self._create_report_prompt(
+                query,
+                search_results,
+                "Not provided - analyze the search results yourself first.",
+                report_type
+            )
+            
+            messages = [
+                {"role": "system", "content": self.fused_system_prompt},
+                {"role": "user", "content": user_prompt}
+            ]
+            params = {
+                "temperature": 0.7,
+                # Detailed reports need room for the analysis as well
+                "max_tokens": 4000 if report_type == "detailed" else 3000,
+                "response_format": {"type": "json_object"}
+            }
+            
+            sent: List[str] = []
+            if on_chunk is not None:
+                def forward(chunk: str):
+                    sent.append(chunk)
+                    on_chunk(chunk)
+                
+                content, tokens_used = await self._stream_fused(messages, forward, **params)
+            else:
+                async with self.semaphore:
+                    content, tokens_used = await cached_completion(
+                        self.client, self.model, messages, **params
+                    )
+            
+            parsed = orjson.loads(content)
+            report = parsed.get("report", "")
+            if on_chunk is not None:
+                # Report text the stream couldn't pass on (a cached response,
+                # or a response in an unexpected shape) goes out in one piece
+                streamed = "".join(sent)
+                if report.startswith(streamed) and len(report) > len(streamed):
+                    on_chunk(report[len(streamed):])
+            analysis = parsed.get("analysis", "")
+            if not isinstance(analysis, str):
+                analysis = orjson.dumps(analysis, option=orjson.OPT_INDENT_2).decode()
+            
+            print(f"✅ {self.name} completed analysis and report generation")
+            
+            result = {
                 "status": "success",
                 "query": query,
                 "report": report,
                 "report_type": report_type,
+                "title": str(parsed.get("title", "")).strip(),
+                "analysis": analysis,
+                "key_points": [str(point).strip() for point in parsed.get("key_points", [])],
                 "model_used": self.model,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": time.time(),
                 "agent": self.name,
-                "tokens_used": response.usage.total_tokens,
+                "tokens_used": tokens_used,
                 "word_count": len(report.split())
             }
             
+            if query_embedding is not None:
+                semantic_cache.insert(namespace, query_embedding, result)
+            
+            return result
+            
         except Exception as e:
             error_msg = f"Report generation failed: {str(e)}"
             print(f"❌ {self.name} error: {error_msg}")
@@ -104,10 +417,215 @@ Use markdown formatting including:
                 "status": "error",
                 "query": query,
                 "error": error_msg,
-                "timestamp": datetime.now().isoformat(),
+                "timestamp": time.time(),
                 "agent": self.name
             }
     
+    async def _stream_fused(self, messages: List[Dict[str, str]],
+                            on_chunk: Callable[[str], None], **kwargs) -> Tuple[str, int]:
+        """
+        Run the fused completion as a stream, passing the report text from its
+        JSON response to on_chunk every STREAM_FLUSH_INTERVAL
+        
+        Returns:
+            Tuple of (complete JSON response, tokens used); tokens are 0 and
+            nothing is streamed when the response was cached
+        """
+        key = response_cache._key(self.model, messages)
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            return cached, 0
+        
+        parts = []
+        buffer = []
+        tokens_used = 0
+        report_field = _ReportFieldStream()
+        last_flush = time.monotonic()
+        
+        async with self.semaphore:
+            stream = await self.client.chat.completions.create(
+                model=self.model,
+                messages=messages,
+                stream=True,
+                stream_options={"include_usage": True},
+                **kwargs
+            )
+            
+            async for chunk in stream:
+                # The final chunk carries the token usage and no choices
+                if chunk.usage is not None:
+                    tokens_used = chunk.usage.total_tokens
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if not token:
+                    continue
+                
+                parts.append(token)
+                text = report_field.feed(token)
+                if text:
+                    buffer.append(text)
+                
+                now = time.monotonic()
+                if buffer and now - last_flush >= STREAM_FLUSH_INTERVAL:
+                    on_chunk("".join(buffer))
+                    buffer.clear()
+                    last_flush = now
+        
+        if buffer:
+            on_chunk("".join(buffer))
+        
+        content = "".join(parts)
+        await response_cache.aset(key, self.model, content)
+        return content, tokens_used
+    
+    async def stream_report(self, 
+                           query: str, 
+                           search_results: str, 
+                           analysis: str,
+                           report_type: str = "detailed",
+                           usage: Optional[Dict[str, int]] = None) -> AsyncIterator[str]:
+        """
+        Stream the report text as it is generated
+        Tokens are buffered for STREAM_FLUSH_INTERVAL before being yielded,
+        so callers get a few chunks per second instead of one per token
+        
+        Args:
+            query: Original research question
+            search_results: Formatted results from Researcher
+            analysis: Analysis from Analyzer agent
+            report_type: "detailed", "summary", or "executive"
+            usage: Optional dict that receives "total_tokens" once the stream ends
+                (0 when the report came from the cache)
+            
+        Yields:
+            Chunks of the Markdown report
+        """
+        print(f"\n{self.name} streaming {report_type} report...")
+        
+        request = self.build_request(query, search_results, analysis, report_type)
+        
+        # Identical prompt already answered: send it in one go
+        key = response_cache._key(self.model, request["messages"])
+        cached = await response_cache.aget(key)
+        if cached is not None:
+            if usage is not None:
+                usage["total_tokens"] = 0
+            yield cached
+            return
+        
+        parts = []
+        buffer = []
+        last_flush = time.monotonic()
+        
+        async with self.semaphore:
+            stream = await self.client.chat.completions.create(
+                **request,
+                stream=True,
+                stream_options={"include_usage": True}
+            )
+            
+            async for chunk in stream:
+                # The final chunk carries the token usage and no choices
+                if chunk.usage is not None and usage is not None:
+                    usage["total_tokens"] = chunk.usage.total_tokens
+                if not chunk.choices:
+                    continue
+                token = chunk.choices[0].delta.content
+                if not token:
+                    continue
+                
+                parts.append(token)
+                buffer.append(token)
+                
+                now = time.monotonic()
+                if now - last_flush >= STREAM_FLUSH_INTERVAL:
+                    yield "".join(buffer)
+                    buffer.clear()
+                    last_flush = now
+        
+        if buffer:
+            yield "".join(buffer)
+        
+        await response_cache.aset(key, self.model, "".join(parts))
+        print(f"✅ {self.name} completed report stream")
+    
+    def build_request(self, 
+                      query: str, 
+                      search_results: str, 
+                      analysis: str,
+                      report_type: str = "detailed") -> Dict[str, Any]:
+        """
+        Chat completion parameters for writing one report
+        Shared by write_report, stream_report and the Batch API path
+        
+        Args:
+            query: Original research question
+            search_results: Formatted results from Researcher
+            analysis: Analysis from Analyzer agent
+            report_type: "detailed", "summary", or "executive"
+            
+        Returns:
+            Keyword arguments for chat.completions.create
+        """
+        user_prompt = self._create_report_prompt(
+            query, search_results, analysis, report_type
+        )
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": self.system_prompt},
+                {"role": "user", "content": user_prompt}
+            ],
+            "temperature": 0.7,
+            "max_tokens": 2000
+        }
+    
+    def report_result(self, query: str, report: str, report_type: str, tokens_used: int) -> Dict[str, Any]:
+        """
+        Wrap generated report text in the write_report result dictionary
+        
+        Args:
+            query: Original research question
+            report: Markdown report text
+            report_type: "detailed", "summary", or "executive"
+            tokens_used: Tokens the generation consumed
+            
+        Returns:
+            Dictionary containing the report and metadata
+        """
+        return {
+            "status": "success",
+            "query": query,
+            "report": report,
+            "report_type": report_type,
+            "model_used": self.model,
+            "timestamp": time.time(),
+            "agent": self.name,
+            "tokens_used": tokens_used,
+            "word_count": len(report.split())
+        }
+    
+    def build_title_request(self, query: str) -> Dict[str, Any]:
+        """
+        Chat completion parameters for generating a report title
+        
+        Args:
+            query: Research question
+            
+        Returns:
+            Keyword arguments for chat.completions.create
+        """
+        return {
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": "Generate a concise, professional title for a research report. Maximum 10 words."},
+                {"role": "user", "content": f"Research question: {query}"}
+            ],
+            "temperature": 0.5,
+            "max_tokens": 20
+        }
+    
     def _create_report_prompt(self, 
                              query: str, 
                              search_results: str, 
@@ -125,76 +643,14 @@ Use markdown formatting including:
         Returns:
             Formatted prompt for GPT-4
         """
-        base_prompt = f"""
-Research Question: {query}
-
-Search Results:
-{search_results[:1500]}  # Truncate if too long
-
-Analysis:
-{analysis}
-
-"""
-        
-        if report_type == "detailed":
-            base_prompt += """
-Please create a DETAILED research report with the following sections:
-
-# Research Report: [Title based on query]
-
-## Executive Summary
-[2-3 paragraph overview of key findings]
-
-## Introduction
-[Context and importance of the research question]
-
-## Methodology
-[Brief description of search and analysis approach]
-
-## Key Findings
-[Detailed findings with subsections as needed]
-
-## Analysis & Insights
-[Deeper analysis of the findings]
-
-## Implications
-[What these findings mean]
-
-## Recommendations
-[Actionable recommendations based on findings]
-
-## Conclusion
-[Summary and final thoughts]
-
-## Sources
-[List key sources used]
-"""
-        
-        elif report_type == "summary":
-            base_prompt += """
-Please create a SUMMARY report (1 page) with:
-
-# [Title]
-## Quick Summary
-## Key Findings (bullet points)
-## Main Insights
-## Recommendations
-## Sources
-"""
-        
-        else:  # executive
-            base_prompt += """
-Please create an EXECUTIVE BRIEF (very concise) with:
-
-# Executive Brief: [Title]
-## The Bottom Line (1 paragraph)
-## Three Key Points
-## Recommended Action
-"""
-        
-        return base_prompt
+        template = _TEMPLATES.get(report_type, _EXEC_TMPL)
+        return template.format(
+            query=query,
+            sr=search_results[:1500],  # Truncate if too long
+            analysis=analysis
+        )
     
-    def generate_title(self, query: str) -> str:
+    async def generate_title(self, query: str) -> str:
         """
         Generate a professional title for the report
         
@@ -205,16 +661,12 @@ Please create an EXECUTIVE BRIEF (very concise) with:
             Professional title
         """
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": "Generate a concise, professional title for a research report. Maximum 10 words."},
-                    {"role": "user", "content": f"Research question: {query}"}
-                ],
-                temperature=0.5,
-                max_tokens=20
-            )
-            return response.choices[0].message.content.strip()
+            async with self.semaphore:
+                title, _ = await cached_completion(
+                    self.client,
+                    **self.build_title_request(query)
+                )
+            return title.strip()
         except:
             return f"Research Report: {query[:50]}"
     
@@ -238,18 +690,11 @@ Please create an EXECUTIVE BRIEF (very concise) with:
             return report
         
         elif format == "html":
-            # Simple markdown to HTML conversion
-            html = report.replace("# ", "<h1>").replace("</h1>\n", "</h1>")
-            html = html.replace("## ", "<h2>").replace("</h2>\n", "</h2>")
-            html = html.replace("### ", "<h3>").replace("</h3>\n", "</h3>")
-            html = html.replace("**", "<strong>").replace("</strong>", "</strong>")
-            html = html.replace("\n", "<br>\n")
-            return f"<html><body>{html}</body></html>"
+            return f"<html><body>{_MARKDOWN(report)}</body></html>"
         
         else:  # text
-            # Remove markdown formatting
-            text = report.replace("#", "").replace("*", "")
-            return text
+            # Remove markdown formatting in a single pass
+            return _MD_STRIP.sub("", report)
 
 
 # Example usage and testing
@@ -293,16 +738,23 @@ INSIGHTS: The platform is evolving from simple chains to complex orchestration.
     
     print("🧪 Testing Writer Agent")
     
-    # Generate different report types
-    for report_type in ["summary", "detailed"]:
-        print(f"\n📝 Generating {report_type} report...")
-        
-        results = writer.write_report(
-            sample_query,
-            sample_search_results,
-            sample_analysis,
-            report_type=report_type
-        )
+    # Generate different report types concurrently
+    async def generate_all(report_types):
+        return await asyncio.gather(*[
+            writer.write_report(
+                sample_query,
+                sample_search_results,
+                sample_analysis,
+                report_type=report_type
+            )
+            for report_type in report_types
+        ])
+    
+    report_types = ["summary", "detailed"]
+    all_results = asyncio.run(generate_all(report_types))
+    
+    for report_type, results in zip(report_types, all_results):
+        print(f"\n📝 Generated {report_type} report")
         
         if results["status"] == "success":
             print(f"\n✅ {report_type.upper()} REPORT:")
@@ -0,0 +1,637 @@
+# backend/cache.py
+"""
+LLM response cache shared by all agents
+Identical prompts sent to the same model are answered from memory (or from a
+SQLite file that survives restarts) instead of calling the OpenAI API again,
+and near-duplicate research queries are matched by embedding similarity.
+Also provides the storage backends for the API's research-result cache.
+"""
+
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple
+import asyncio
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+
+import numpy as np
+import orjson
+from cachetools import TTLCache
+
+from config.settings import settings
+
+# Collapses runs of whitespace so formatting differences don't change the key
+_WHITESPACE_RE = re.compile(r"\s+")
+
+# Sentence punctuation at the end of a query ("...?" vs "...")
+_TRAILING_PUNCTUATION_RE = re.compile(r"[\s.?!]+$")
+
+
+class SQLiteBackend:
+    """
+    File-backed store for cached LLM responses, so the cache survives
+    uvicorn reloads and process restarts.
+    Calls are blocking; async code should run them via asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = ".llm_cache.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        # WAL lets readers proceed while a write is in progress
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS llm_cache("
+            "key TEXT PRIMARY KEY, model TEXT, content BLOB, created REAL)"
+        )
+        self._conn.commit()
+
+    def get(self, key: str, ttl: float) -> Optional[str]:
+        """Return the stored content if it is younger than ttl seconds"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT content FROM llm_cache WHERE key = ? AND created > ?",
+                (key, time.time() - ttl)
+            ).fetchone()
+        return row[0] if row else None
+
+    def set(self, key: str, model: str, content: str) -> None:
+        """Insert or overwrite an entry"""
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO llm_cache(key, model, content, created) "
+                "VALUES (?, ?, ?, ?)",
+                (key, model, content, time.time())
+            )
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Delete all entries"""
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._conn.commit()
+
+
+class ResponseCacheManager:
+    """
+    Process-wide LRU cache for chat completion responses.
+    Entries expire after TTL seconds and the least recently used entry is
+    evicted once MAX_SIZE is reached. An optional SQLiteBackend sits behind
+    the in-memory LRU and persists every response.
+    """
+
+    MAX_SIZE = 1000
+    TTL = 24 * 3600  # 24 hours in seconds
+
+    def __init__(self, backend: Optional[SQLiteBackend] = None):
+        # key -> (content, expires_at on the time.monotonic clock)
+        self.cache: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self.backend = backend
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, model: str, messages: List[Dict[str, str]]) -> str:
+        """Build a stable cache key from the model and normalized prompt"""
+        parts = [model]
+        for message in messages:
+            content = _WHITESPACE_RE.sub(" ", message["content"].lower()).strip()
+            parts.append(f"{message['role']}:{content}")
+        return hashlib.sha256("\n".join(parts).encode()).hexdigest()
+
+    def _get_memory(self, key: str) -> Optional[str]:
+        """Look up the in-memory LRU, dropping the entry if it expired"""
+        item = self.cache.get(key)
+
+        if item is not None:
+            content, expires_at = item
+            if time.monotonic() < expires_at:
+                # Mark as most recently used
+                self.cache.move_to_end(key)
+                return content
+            # Expired, remove it
+            del self.cache[key]
+
+        return None
+
+    def get(self, key: str) -> Optional[str]:
+        """Return the cached response content from memory, or None on miss/expiry"""
+        content = self._get_memory(key)
+        if content is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return content
+
+    def set(self, key: str, content: str) -> None:
+        """Store a response in memory, evicting the oldest entry when full"""
+        self.cache[key] = (content, time.monotonic() + self.TTL)
+        self.cache.move_to_end(key)
+        if len(self.cache) > self.MAX_SIZE:
+            self.cache.popitem(last=False)
+
+    async def aget(self, key: str) -> Optional[str]:
+        """Return the cached response from memory or the persistent backend"""
+        content = self._get_memory(key)
+
+        if content is None and self.backend is not None:
+            content = await asyncio.to_thread(self.backend.get, key, self.TTL)
+            if content is not None:
+                # Promote to memory for the next lookup
+                self.set(key, content)
+
+        if content is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+        return content
+
+    async def aset(self, key: str, model: str, content: str) -> None:
+        """Store a response in memory and the persistent backend"""
+        self.set(key, content)
+        if self.backend is not None:
+            await asyncio.to_thread(self.backend.set, key, model, content)
+
+    def clear(self) -> None:
+        """Clear all cached responses"""
+        self.cache.clear()
+        if self.backend is not None:
+            self.backend.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        total_requests = self.hits + self.misses
+        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+
+        return {
+            "size": len(self.cache),
+            "max_size": self.MAX_SIZE,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": f"{hit_rate:.1f}%",
+            "persistent": self.backend.path if self.backend is not None else None
+        }
+
+
+async def cached_completion(client, model: str, messages: List[Dict[str, str]],
+                            **kwargs) -> Tuple[str, int]:
+    """
+    Call chat.completions.create unless an identical request is cached
+
+    Args:
+        client: AsyncOpenAI client
+        model: Which GPT model to use
+        messages: Chat messages to send
+        **kwargs: Extra parameters for the completion call
+
+    Returns:
+        Tuple of (response content, tokens used); tokens are 0 on a cache hit
+    """
+    key = response_cache._key(model, messages)
+    content = await response_cache.aget(key)
+    if content is not None:
+        return content, 0
+
+    response = await client.chat.completions.create(
+        model=model,
+        messages=messages,
+        **kwargs
+    )
+    content = response.choices[0].message.content
+    await response_cache.aset(key, model, content)
+
+    # Report how much of the prompt prefix OpenAI served from its prompt cache
+    details = getattr(response.usage, "prompt_tokens_details", None)
+    cached_tokens = getattr(details, "cached_tokens", 0) or 0
+    if cached_tokens:
+        print(f"   ⚡ Prompt cache: {cached_tokens}/{response.usage.prompt_tokens} prompt tokens cached")
+
+    return content, response.usage.total_tokens
+
+
+class EmbeddingStore:
+    """
+    SQLite table of query embeddings, so each distinct query is embedded
+    once across restarts. Rows made with a different embedding model count
+    as missing until they are re-embedded.
+    Calls are blocking; async code should run them via asyncio.to_thread.
+    """
+
+    def __init__(self, path: str = ".llm_cache.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings("
+            "query_hash TEXT PRIMARY KEY, model TEXT, query TEXT, vec BLOB)"
+        )
+        self._conn.commit()
+
+    @staticmethod
+    def _hash(text: str) -> str:
+        return hashlib.sha256(text.encode()).hexdigest()
+
+    def get(self, text: str, model: str) -> Optional[np.ndarray]:
+        """Return the stored embedding of text made with model, if any"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT vec FROM embeddings WHERE query_hash = ? AND model = ?",
+                (self._hash(text), model)
+            ).fetchone()
+        return np.frombuffer(row[0], dtype=np.float32) if row else None
+
+    def set_many(self, model: str, items: List[Tuple[str, np.ndarray]]) -> None:
+        """Insert or overwrite the embeddings of several texts"""
+        with self._lock:
+            self._conn.executemany(
+                "INSERT OR REPLACE INTO embeddings(query_hash, model, query, vec) "
+                "VALUES (?, ?, ?, ?)",
+                [(self._hash(text), model, text, vector.tobytes()) for text, vector in items]
+            )
+            self._conn.commit()
+
+    def stale_queries(self, model: str) -> List[str]:
+        """Texts whose stored embedding was made with another model"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT query FROM embeddings WHERE model != ?", (model,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def clear(self) -> None:
+        """Delete all entries"""
+        with self._lock:
+            self._conn.execute("DELETE FROM embeddings")
+            self._conn.commit()
+
+
+class SemanticCache:
+    """
+    Cache of agent results keyed by the embedding of the research query.
+    A reworded query whose embedding is close enough to a previous one
+    reuses that result instead of running the agent again.
+    Query embeddings are kept in memory and, with an EmbeddingStore, on disk.
+    """
+
+    EMBEDDING_MODEL = settings.EMBEDDING_MODEL
+    THRESHOLD = 0.92  # Minimum cosine similarity for a hit
+    MAX_SIZE = 1000  # Entries per namespace; a flat matrix scan stays cheap
+    EMBED_BATCH_SIZE = 2048  # Most inputs OpenAI accepts in one embeddings call
+
+    def __init__(self, store: Optional[EmbeddingStore] = None):
+        # namespace -> stacked unit embeddings and the aligned results
+        self.vectors: Dict[str, np.ndarray] = {}
+        self.results: Dict[str, List[Dict[str, Any]]] = {}
+        # query text -> embedding, so agents share one embedding call per query
+        self.embedding_memo: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+
+    async def embed(self, client, query: str) -> Optional[np.ndarray]:
+        """
+        Embed a query with OpenAI, normalized to unit length
+
+        Returns:
+            The embedding, or None if the embedding call failed
+        """
+        return (await self.embed_many(client, [query]))[0]
+
+    async def embed_many(self, client, queries: List[str]) -> List[Optional[np.ndarray]]:
+        """
+        Embed several queries, sending every uncached one in batched API calls
+        of up to EMBED_BATCH_SIZE inputs
+
+        Returns:
+            One unit-length embedding per query, None where the call failed
+        """
+        texts = [self.normalize(query) for query in queries]
+
+        found: Dict[str, np.ndarray] = {}
+        missing: List[str] = []
+        for text in dict.fromkeys(texts):
+            vector = await self._cached_embedding(text)
+            if vector is None:
+                missing.append(text)
+            else:
+                found[text] = vector
+
+        for start in range(0, len(missing), self.EMBED_BATCH_SIZE):
+            chunk = missing[start:start + self.EMBED_BATCH_SIZE]
+            try:
+                response = await client.embeddings.create(
+                    model=self.EMBEDDING_MODEL,
+                    input=chunk
+                )
+            except Exception as e:
+                print(f"Semantic cache embedding failed: {e}")
+                continue
+
+            data = sorted(response.data, key=lambda item: item.index)
+            matrix = np.asarray([item.embedding for item in data], dtype=np.float32)
+            matrix /= np.linalg.norm(matrix, axis=1, keepdims=True)
+
+            embedded = list(zip(chunk, matrix))
+            for text, vector in embedded:
+                self._remember(text, vector)
+                found[text] = vector
+            if self.store is not None:
+                await asyncio.to_thread(self.store.set_many, self.EMBEDDING_MODEL, embedded)
+
+        return [found.get(text) for text in texts]
+
+    @staticmethod
+    def normalize(query: str) -> str:
+        """
+        Key under which a query's embedding is kept: queries that differ only
+        in case, whitespace or closing punctuation share one embedding
+        """
+        text = _WHITESPACE_RE.sub(" ", query.lower()).strip()
+        return _TRAILING_PUNCTUATION_RE.sub("", text)
+
+    async def _cached_embedding(self, text: str) -> Optional[np.ndarray]:
+        """Embedding of text from memory or disk"""
+        vector = self.embedding_memo.get(text)
+        if vector is not None:
+            self.embedding_memo.move_to_end(text)
+            return vector
+
+        if self.store is not None:
+            vector = await asyncio.to_thread(self.store.get, text, self.EMBEDDING_MODEL)
+        if vector is not None:
+            self._remember(text, vector)
+        return vector
+
+    def _remember(self, text: str, vector: np.ndarray) -> None:
+        """Add an embedding to the in-memory memo, dropping the oldest when full"""
+        self.embedding_memo[text] = vector
+        self.embedding_memo.move_to_end(text)
+        if len(self.embedding_memo) > self.MAX_SIZE:
+            self.embedding_memo.popitem(last=False)
+
+    async def reembed_stale(self, client) -> int:
+        """
+        Re-embed, in batches, every stored query whose embedding was made with
+        another model (after EMBEDDING_MODEL changes)
+
+        Returns:
+            Number of queries re-embedded
+        """
+        if self.store is None:
+            return 0
+        queries = await asyncio.to_thread(self.store.stale_queries, self.EMBEDDING_MODEL)
+        if queries:
+            await self.embed_many(client, queries)
+        return len(queries)
+
+    def lookup(self, namespace: str, vector: np.ndarray,
+               threshold: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Return the most similar cached result above the threshold (THRESHOLD by default), if any"""
+        if threshold is None:
+            threshold = self.THRESHOLD
+        matrix = self.vectors.get(namespace)
+        if matrix is not None:
+            # Cosine similarity against every cached embedding in one matmul
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            if similarities[best] >= threshold:
+                self.hits += 1
+                return self.results[namespace][best]
+
+        self.misses += 1
+        return None
+
+    def insert(self, namespace: str, vector: np.ndarray, result: Dict[str, Any]) -> None:
+        """Store a result, dropping the oldest entry when the namespace is full"""
+        matrix = self.vectors.get(namespace)
+        results = self.results.setdefault(namespace, [])
+
+        if matrix is None:
+            matrix = vector[np.newaxis, :]
+        else:
+            matrix = np.vstack([matrix, vector])
+        results.append(result)
+
+        if len(results) > self.MAX_SIZE:
+            matrix = matrix[1:]
+            results.pop(0)
+
+        self.vectors[namespace] = matrix
+
+    def clear(self) -> None:
+        """Clear all cached results and embeddings"""
+        self.vectors.clear()
+        self.results.clear()
+        self.embedding_memo.clear()
+        if self.store is not None:
+            self.store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        total_requests = self.hits + self.misses
+        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+
+        return {
+            "size": sum(len(results) for results in self.results.values()),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": f"{hit_rate:.1f}%",
+            "threshold": self.THRESHOLD,
+            "embedding_model": self.EMBEDDING_MODEL,
+            "persistent": self.store.path if self.store is not None else None
+        }
+
+
+class ResultDiskCache:
+    """
+    Exact-match cache of complete workflow results in a SQLite file.
+    Keyed by query, report type, model and PROMPT_VERSION, so re-running the
+    same queries (test scripts, offline reports) returns instantly across
+    processes. Bump PROMPT_VERSION, or set an invalidation time, when the
+    prompts change.
+    """
+
+    PROMPT_VERSION = "v1"
+
+    def __init__(self, directory: str, invalidate_before: Optional[datetime] = None):
+        os.makedirs(directory, exist_ok=True)
+        self.store = SQLiteBackend(os.path.join(directory, "results.db"))
+        # Entries written before this moment are treated as missing
+        self.invalidate_before = invalidate_before.timestamp() if invalidate_before else None
+        self.hits = 0
+        self.misses = 0
+
+    def _key(self, query: str, report_type: str) -> str:
+        return hashlib.sha256(
+            f"{query}|{report_type}|{settings.OPENAI_MODEL}|{self.PROMPT_VERSION}".encode()
+        ).hexdigest()
+
+    async def get(self, query: str, report_type: str) -> Optional[Dict[str, Any]]:
+        """Return the stored result for this exact query, or None"""
+        max_age = (
+            time.time() - self.invalidate_before
+            if self.invalidate_before is not None else float("inf")
+        )
+        raw = await asyncio.to_thread(self.store.get, self._key(query, report_type), max_age)
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        return orjson.loads(raw)
+
+    async def set(self, query: str, report_type: str, result: Dict[str, Any]) -> None:
+        """Store a successful workflow result"""
+        await asyncio.to_thread(
+            self.store.set,
+            self._key(query, report_type),
+            settings.OPENAI_MODEL,
+            orjson.dumps(result).decode()
+        )
+
+    def clear(self) -> None:
+        """Delete all stored results"""
+        self.store.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache statistics"""
+        return {
+            "path": self.store.path,
+            "hits": self.hits,
+            "misses": self.misses
+        }
+
+
+class CacheBackend(ABC):
+    """
+    Storage for the API's research-result cache.
+    Values are JSON-serializable dicts; entries expire after the backend's TTL.
+    """
+
+    @abstractmethod
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Return the stored value, or None if missing or expired"""
+
+    @abstractmethod
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        """Store a value"""
+
+    @abstractmethod
+    async def clear(self) -> None:
+        """Delete all entries"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Any]:
+        """Get backend statistics"""
+
+
+class InMemoryBackend(CacheBackend):
+    """Per-process store; bounded in size and lost on restart"""
+
+    def __init__(self, ttl: int, maxsize: int = 1024):
+        self.cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        # Expired entries are dropped by the TTLCache itself
+        return self.cache.get(key)
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        self.cache[key] = value
+
+    async def clear(self) -> None:
+        self.cache.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": "memory",
+            "size": len(self.cache),
+            "max_size": self.cache.maxsize
+        }
+
+
+class RedisBackend(CacheBackend):
+    """
+    Redis store shared by every worker and surviving restarts.
+    Redis errors are reported and treated as misses, so an outage
+    only costs cache hits.
+    """
+
+    PREFIX = "research:"
+
+    def __init__(self, url: str, ttl: int):
+        # Optional dependency, only needed when this backend is selected
+        import redis.asyncio as redis
+
+        self.url = url
+        self.ttl = ttl
+        self._redis = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        try:
+            raw = await self._redis.get(self.PREFIX + key)
+        except Exception as e:
+            print(f"Redis cache read failed: {e}")
+            return None
+        return orjson.loads(raw) if raw is not None else None
+
+    async def set(self, key: str, value: Dict[str, Any]) -> None:
+        try:
+            await self._redis.set(self.PREFIX + key, orjson.dumps(value), ex=self.ttl)
+        except Exception as e:
+            print(f"Redis cache write failed: {e}")
+
+    async def clear(self) -> None:
+        # Only our own keys; the database may be shared
+        batch = []
+        async for key in self._redis.scan_iter(match=self.PREFIX + "*", count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                await self._redis.delete(*batch)
+                batch = []
+        if batch:
+            await self._redis.delete(*batch)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": "redis", "url": self.url}
+
+
+def create_result_backend(name: str, ttl: int, maxsize: int = 1024) -> CacheBackend:
+    """
+    Build the research-result cache backend selected by name
+
+    Args:
+        name: "memory" or "redis"
+        ttl: Entry lifetime in seconds
+        maxsize: Maximum entries for the in-memory backend
+
+    Returns:
+        The backend instance
+    """
+    if name == "memory":
+        return InMemoryBackend(ttl, maxsize)
+    if name == "redis":
+        return RedisBackend(settings.REDIS_URL, ttl)
+    raise ValueError(f"Unknown CACHE_BACKEND: {name!r} (expected 'memory' or 'redis')")
+
+
+# Single instances shared across the process
+response_cache = ResponseCacheManager(
+    backend=SQLiteBackend(settings.LLM_CACHE_PATH) if settings.LLM_CACHE_PATH else None
+)
+semantic_cache = SemanticCache(
+    store=EmbeddingStore(settings.LLM_CACHE_PATH) if settings.LLM_CACHE_PATH else None
+)
+result_disk_cache = (
+    ResultDiskCache(
+        settings.RESEARCH_CACHE_DIR,
+        datetime.fromisoformat(settings.RESEARCH_CACHE_INVALIDATE_BEFORE)
+        if settings.RESEARCH_CACHE_INVALIDATE_BEFORE else None
+    )
+    if settings.RESEARCH_CACHE_DIR else None
+)
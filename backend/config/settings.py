@@ -4,10 +4,13 @@ This file loads environment variables and provides them to the application
 """
 
 import os
-from dotenv import load_dotenv
 
-# Load environment variables from .env file
-load_dotenv()
+# Load environment variables from .env file (production sets them directly)
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
 
 class Settings:
     """Application settings loaded from environment variables"""
@@ -19,6 +22,35 @@ class Settings:
     # Model Settings
     OPENAI_MODEL: str = "gpt-4o-mini"  # Using the efficient mini model
     TEMPERATURE: float = 0.7  # Creativity level (0=deterministic, 1=creative)
+    # Embeddings for the semantic cache; stored embeddings are redone on change
+    EMBEDDING_MODEL: str = os.getenv("EMBEDDING_MODEL", "text-embedding-3-small")
+    
+    # Analyze and write every report in one OpenAI call; False keeps separate
+    # analyze -> write steps for detailed reports. Either way the report is streamed
+    FUSED_ANALYZE_WRITE: bool = os.getenv("FUSED_ANALYZE_WRITE", "True").lower() == "true"
+    
+    # After each report, research the analysis' key points in the background
+    # so likely follow-up questions are already cached (uses extra API calls)
+    PREFETCH_RELATED: bool = os.getenv("PREFETCH_RELATED", "False").lower() == "true"
+    
+    # Persistent LLM response and query-embedding cache (SQLite file); set empty to keep them in memory only
+    LLM_CACHE_PATH: str = os.getenv("LLM_CACHE_PATH", ".llm_cache.db")
+    
+    # Directory for the on-disk cache of complete research results (exact query
+    # matches); empty disables it. Results stored before the optional ISO
+    # timestamp RESEARCH_CACHE_INVALIDATE_BEFORE are ignored.
+    RESEARCH_CACHE_DIR: str = os.getenv("RESEARCH_CACHE_DIR", "")
+    RESEARCH_CACHE_INVALIDATE_BEFORE: str = os.getenv("RESEARCH_CACHE_INVALIDATE_BEFORE", "")
+    
+    # Research-result cache: "memory" (per process) or "redis" (shared by all workers)
+    CACHE_BACKEND: str = os.getenv("CACHE_BACKEND", "memory").lower()
+    REDIS_URL: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+    
+    # Worker threads for blocking calls run off the event loop (SQLite caches via asyncio.to_thread)
+    MAX_WORKERS: int = int(os.getenv("MAX_WORKERS", "8"))
+    
+    # Record per-node timings and add them to results as metadata["profile"]
+    RESEARCH_PROFILE: bool = os.getenv("RESEARCH_PROFILE", "0") == "1"
     
     # Debug
     DEBUG: bool = os.getenv("DEBUG", "False").lower() == "true"
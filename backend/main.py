@@ -4,26 +4,49 @@ FastAPI server for Multi-Agent Research Assistant
 This serves as the API layer between the frontend and our agent system
 """
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import Depends, FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
+from fastapi.exceptions import RequestValidationError
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
-from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import ORJSONResponse, StreamingResponse
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from typing import Optional, Dict, Any, Awaitable, Callable, Set, Tuple, Union
 from datetime import datetime
 import asyncio
-import json
-import hashlib
-import logging
 import concurrent.futures
+import functools
+import orjson
+import logging
+import re
+import xxhash
 
 # Import our workflow and settings
 from workflow.research_graph import ResearchWorkflow
 from config.settings import settings
+from cache import (
+    CacheBackend, create_result_backend, response_cache, result_disk_cache, semantic_cache
+)
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Collapses runs of whitespace when normalizing queries for the cache key
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
+@functools.lru_cache(maxsize=4096)
+def _cache_key(query: str, report_type: str = "detailed") -> str:
+    """
+    Result-cache key for a query and report type
+    Memoized, so the lookup and store for one request normalize and hash once
+    """
+    # Case, spacing and trailing punctuation don't change the question:
+    # "What is FastAPI?" and "what  is fastapi" share a key
+    normalized = _WHITESPACE_RE.sub(" ", query.lower()).strip().rstrip("?.! ")
+    # Fast non-cryptographic 64-bit hash of the normalized query
+    return xxhash.xxh3_64_hexdigest(f"{report_type}:{normalized}".encode())
+
 # ============================================
 # Initialize FastAPI app
 # ============================================
@@ -32,7 +55,8 @@ app = FastAPI(
     description="API for AI-powered research using multiple specialized agents",
     version="1.0.0",
     docs_url="/docs",  # Swagger UI at http://localhost:8000/docs
-    redoc_url="/redoc"  # ReDoc at http://localhost:8000/redoc
+    redoc_url="/redoc",  # ReDoc at http://localhost:8000/redoc
+    default_response_class=ORJSONResponse  # Faster JSON encoding for large reports
 )
 
 # ============================================
@@ -54,61 +78,137 @@ app.add_middleware(
     expose_headers=["*"],
 )
 
+# Compress larger HTTP responses (reports are Markdown and shrink several
+# times over); small responses aren't worth the CPU
+app.add_middleware(GZipMiddleware, minimum_size=1024)
+
 # ============================================
-# In-Memory Cache Implementation
+# Result Cache Implementation
 # ============================================
 class CacheManager:
     """
-    Simple in-memory cache to avoid repeated API calls
-    In production, you might want to use Redis instead
+    Result cache to avoid repeated API calls
+    Entries expire ttl_hours after they were stored. Storage is in memory by
+    default, or Redis so the cache is shared by all workers and survives restarts.
+    Concurrent requests for the same uncached query share a single workflow run
     """
-    def __init__(self, ttl_hours: int = 24):
-        self.cache: Dict[str, Dict[str, Any]] = {}
+    def __init__(self, ttl_hours: int = 24, maxsize: int = 1024, backend: str = "memory"):
+        self.backend: CacheBackend = create_result_backend(backend, ttl_hours * 3600, maxsize)
         self.ttl_hours = ttl_hours
         self.hits = 0
         self.misses = 0
+        self.normalized_hits = 0  # Hits whose query text differed from the cached one
+        self.coalesced = 0
+        # key -> future resolved by the request that is currently computing it
+        self._inflight: Dict[str, asyncio.Future] = {}
     
-    def _get_key(self, query: str) -> str:
-        """Generate a unique cache key for the query"""
-        # Create hash of lowercase, stripped query for consistency
-        normalized_query = query.lower().strip()
-        return hashlib.md5(normalized_query.encode()).hexdigest()
-    
-    def get(self, query: str) -> Optional[Dict[str, Any]]:
-        """Retrieve cached result if available and not expired"""
-        key = self._get_key(query)
+    async def get_entry(self, query: str, report_type: str = "detailed") -> Optional[Dict[str, Any]]:
+        """Retrieve the cache entry (result plus pre-serialized response) if available"""
+        key = _cache_key(query, report_type)
         
-        if key in self.cache:
-            cached_item = self.cache[key]
-            # Check if cache is still valid (within TTL)
-            cache_age_hours = (datetime.now() - cached_item["timestamp"]).seconds / 3600
-            
-            if cache_age_hours < self.ttl_hours:
-                self.hits += 1
-                logger.info(f"Cache HIT for query: {query[:50]}...")
-                return cached_item["data"]
-            else:
-                # Cache expired, remove it
-                del self.cache[key]
-                logger.info(f"Cache EXPIRED for query: {query[:50]}...")
+        cached_item = await self.backend.get(key)
+        if cached_item is None:
+            self.misses += 1
+            logger.info("Cache MISS for query: %.50s...", query)
+            return None
         
-        self.misses += 1
-        logger.info(f"Cache MISS for query: {query[:50]}...")
-        return None
-    
-    def set(self, query: str, data: Dict[str, Any]) -> None:
-        """Store result in cache"""
-        key = self._get_key(query)
-        self.cache[key] = {
+        self.hits += 1
+        if cached_item["query"] != query:
+            self.normalized_hits += 1
+        logger.info("Cache HIT for query: %.50s...", query)
+        return cached_item
+    
+    async def get(self, query: str, report_type: str = "detailed") -> Optional[Dict[str, Any]]:
+        """Retrieve cached result if available and not expired"""
+        cached_item = await self.get_entry(query, report_type)
+        return cached_item["data"] if cached_item is not None else None
+    
+    async def set(self, query: str, data: Dict[str, Any], report_type: str = "detailed") -> Dict[str, Any]:
+        """Store result in cache and return the new entry"""
+        key = _cache_key(query, report_type)
+        entry = {
             "data": data,
-            "timestamp": datetime.now(),
-            "query": query
+            "query": query,
+            # The /api/research body for a cache hit on exactly this query
+            # text, serialized once here (timestamp = when it was cached)
+            "response_json": orjson.dumps({
+                "success": True,
+                "query": query,
+                "report": data.get("report"),
+                "error": None,
+                "metadata": data.get("metadata", {}),
+                "cached": True,
+                "timestamp": datetime.now()
+            }).decode()
         }
-        logger.info(f"Cached result for query: {query[:50]}...")
+        await self.backend.set(key, entry)
+        logger.info("Cached result for query: %.50s...", query)
+        return entry
     
-    def clear(self) -> None:
+    async def get_or_compute(self, query: str,
+                             coro_factory: Callable[[], Awaitable[Dict[str, Any]]],
+                             report_type: str = "detailed") -> Tuple[Dict[str, Any], bool]:
+        """
+        Return the cached result, or compute it exactly once
+        
+        If another request is already computing the same query, wait for its
+        result instead of starting a second workflow run.
+        
+        Args:
+            query: The research query
+            coro_factory: Called with no arguments to start the computation
+            report_type: Type of report being requested
+        
+        Returns:
+            Tuple of (cache entry, whether it came from the cache); the
+            workflow result is entry["data"]
+        """
+        key = _cache_key(query, report_type)
+        
+        # The backend lookup may be a network round trip, so it must not
+        # serialize lookups for other queries
+        cached_item = await self.get_entry(query, report_type)
+        if cached_item is not None:
+            return cached_item, True
+        
+        # No await between checking and registering the in-flight future, so
+        # two requests on the event loop can't both become the owner
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().create_future()
+            self._inflight[key] = future
+            owner = True
+        else:
+            owner = False
+        
+        if not owner:
+            self.coalesced += 1
+            logger.info("Waiting for in-flight research: %.50s...", query)
+            # Shield so a waiter giving up doesn't cancel the shared result
+            return await asyncio.shield(future), False
+        
+        try:
+            result = await coro_factory()
+            if result.get("success"):
+                entry = await self.set(query, result, report_type)
+            else:
+                entry = {"data": result, "query": query}
+            future.set_result(entry)
+            return entry, False
+        except BaseException as e:
+            if not isinstance(e, Exception):
+                e = RuntimeError("Research was cancelled")
+            future.set_exception(e)
+            # Mark the exception as retrieved in case nobody else was waiting
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(key, None)
+    
+    async def clear(self) -> None:
         """Clear all cached items"""
-        self.cache.clear()
+        await self.backend.clear()
+        _cache_key.cache_clear()
         logger.info("Cache cleared")
     
     def stats(self) -> Dict[str, Any]:
@@ -117,24 +217,33 @@ class CacheManager:
         hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
         
         return {
-            "size": len(self.cache),
+            **self.backend.stats(),
             "hits": self.hits,
+            "normalized_hits": self.normalized_hits,
             "misses": self.misses,
             "hit_rate": f"{hit_rate:.1f}%",
+            "coalesced": self.coalesced,
+            "in_flight": len(self._inflight),
             "ttl_hours": self.ttl_hours
         }
 
 # Initialize cache
-cache = CacheManager(ttl_hours=24)
+cache = CacheManager(ttl_hours=24, backend=settings.CACHE_BACKEND)
 
-# Initialize workflow (single instance for reuse)
-workflow = ResearchWorkflow()
+# Shared, bounded pool for blocking work (asyncio.to_thread, e.g. the SQLite cache)
+EXECUTOR = concurrent.futures.ThreadPoolExecutor(
+    max_workers=settings.MAX_WORKERS,
+    thread_name_prefix="research"
+)
 
 # ============================================
 # Pydantic Models for Request/Response
 # ============================================
 class ResearchRequest(BaseModel):
     """Model for research request"""
+    # Immutable, and the query is stripped before it reaches the cache key
+    model_config = ConfigDict(frozen=True, str_strip_whitespace=True)
+    
     query: str = Field(
         ...,  # Required field
         min_length=5,
@@ -150,6 +259,28 @@ class ResearchRequest(BaseModel):
         description="Type of report: 'detailed', 'summary', or 'executive'"
     )
 
+async def parse_research_request(request: Request) -> ResearchRequest:
+    """
+    Parse and validate the request body in one pass with pydantic-core,
+    instead of FastAPI decoding the JSON first and validating the dict after
+    """
+    try:
+        return ResearchRequest.model_validate_json(await request.body())
+    except ValidationError as e:
+        # Same 422 response FastAPI gives for an invalid body
+        raise RequestValidationError([
+            {**error, "loc": ("body", *error["loc"])}
+            for error in e.errors(include_url=False)
+        ])
+
+# Body schema for the docs, since the endpoints read the raw body themselves
+RESEARCH_REQUEST_OPENAPI = {
+    "requestBody": {
+        "required": True,
+        "content": {"application/json": {"schema": ResearchRequest.model_json_schema()}}
+    }
+}
+
 class ResearchResponse(BaseModel):
     """Model for research response"""
     success: bool
@@ -172,34 +303,108 @@ class HealthResponse(BaseModel):
 # WebSocket Connection Manager
 # ============================================
 class ConnectionManager:
-    """Manages WebSocket connections for real-time updates"""
+    """
+    Manages WebSocket connections for real-time updates
+    Each client gets its own bounded send queue drained by a dedicated task,
+    so a slow client only ever delays itself
+    """
+    SEND_QUEUE_SIZE = 64  # Messages buffered per client before backpressure
+    BATCH_MAX = 8  # Queued messages combined into one websocket frame
+    SEND_TIMEOUT = 10  # Seconds send_json waits on a full queue before dropping the client
+    
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.active_connections: Set[WebSocket] = set()
+        self.send_queues: Dict[WebSocket, asyncio.Queue] = {}
+        self.send_tasks: Dict[WebSocket, asyncio.Task] = {}
     
     async def connect(self, websocket: WebSocket):
         """Accept new WebSocket connection"""
         await websocket.accept()
-        self.active_connections.append(websocket)
-        logger.info(f"Client connected. Total connections: {len(self.active_connections)}")
+        self.active_connections.add(websocket)
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.SEND_QUEUE_SIZE)
+        self.send_queues[websocket] = queue
+        self.send_tasks[websocket] = asyncio.create_task(self._sender(websocket, queue))
+        logger.info("Client connected. Total connections: %d", len(self.active_connections))
     
     def disconnect(self, websocket: WebSocket):
-        """Remove disconnected WebSocket"""
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
-        logger.info(f"Client disconnected. Total connections: {len(self.active_connections)}")
-    
-    async def send_json(self, websocket: WebSocket, data: dict):
-        """Send JSON data to specific client"""
-        await websocket.send_json(data)
-    
-    async def broadcast(self, data: dict):
-        """Broadcast to all connected clients"""
-        for connection in self.active_connections:
+        """Remove disconnected WebSocket and stop its sender"""
+        self.active_connections.discard(websocket)
+        self.send_queues.pop(websocket, None)
+        task = self.send_tasks.pop(websocket, None)
+        if task is not None and task is not asyncio.current_task():
+            task.cancel()
+        logger.info("Client disconnected. Total connections: %d", len(self.active_connections))
+    
+    @staticmethod
+    def _encode(data: Union[dict, str]) -> str:
+        """JSON text for a queued message (strings are already encoded)"""
+        if isinstance(data, str):
+            return data
+        # orjson encodes much faster than the stdlib json used by send_json;
+        # sent as a text frame so the client still gets a string
+        return orjson.dumps(data, default=str).decode()
+    
+    async def _sender(self, websocket: WebSocket, queue: asyncio.Queue):
+        """
+        Send queued messages to one client, in order
+        Messages that are already waiting when a send starts go out together
+        as one {"type": "batch", "events": [...]} frame; nothing is held back
+        to wait for more
+        """
+        try:
+            while True:
+                frames = [self._encode(await queue.get())]
+                while len(frames) < self.BATCH_MAX and not queue.empty():
+                    frames.append(self._encode(queue.get_nowait()))
+                
+                if len(frames) == 1:
+                    await websocket.send_text(frames[0])
+                else:
+                    await websocket.send_text(
+                        '{"type":"batch","events":[' + ",".join(frames) + "]}"
+                    )
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Connection closed underneath us
+            logger.info("Send failed, dropping client: %s", e)
+            self.disconnect(websocket)
+    
+    async def send_json(self, websocket: WebSocket, data: Union[dict, str]):
+        """
+        Queue JSON data for a specific client, waiting while its queue is full
+        data may also be an already encoded JSON string, which is sent as-is
+        Raises WebSocketDisconnect if the client is gone or stays full for
+        SEND_TIMEOUT seconds (e.g. its sender died and nothing drains the queue)
+        """
+        queue = self.send_queues.get(websocket)
+        if queue is None:
+            raise WebSocketDisconnect(code=1006)
+        try:
+            await asyncio.wait_for(queue.put(data), self.SEND_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Client send queue stayed full, closing slow client")
+            if self.send_queues.get(websocket) is queue:
+                self.disconnect(websocket)
+                asyncio.create_task(websocket.close(code=1013))
+            raise WebSocketDisconnect(code=1013)
+        # The client may have been dropped while we waited
+        if self.send_queues.get(websocket) is not queue:
+            raise WebSocketDisconnect(code=1006)
+    
+    async def broadcast(self, data: Union[dict, str]):
+        """Broadcast to all connected clients, dropping any that can't keep up"""
+        # Copy, since dropping a slow client mutates the collections
+        for connection in list(self.active_connections):
+            queue = self.send_queues.get(connection)
+            if queue is None:
+                continue
             try:
-                await connection.send_json(data)
-            except:
-                # Connection might be closed
-                pass
+                queue.put_nowait(data)
+            except asyncio.QueueFull:
+                logger.warning("Client send queue full, closing slow client")
+                self.disconnect(connection)
+                asyncio.create_task(connection.close(code=1013))
 
 # Initialize connection manager
 manager = ConnectionManager()
@@ -219,6 +424,7 @@ async def root():
             "docs": "http://localhost:8000/docs",
             "health": "http://localhost:8000/health",
             "research": "POST http://localhost:8000/api/research",
+            "research_stream": "POST http://localhost:8000/api/research/stream",
             "websocket": "ws://localhost:8000/ws"
         }
     }
@@ -233,15 +439,13 @@ async def health_check():
         status="healthy",
         timestamp=datetime.now(),
         cache_stats=cache.stats(),
-        workflow_ready=workflow is not None,
-        apis_configured={
-            "openai": bool(settings.OPENAI_API_KEY),
-            "tavily": bool(settings.TAVILY_API_KEY)
-        }
+        workflow_ready=getattr(app.state, "workflow", None) is not None,
+        apis_configured=app.state.apis_configured
     )
 
-@app.post("/api/research", response_model=ResearchResponse, tags=["Research"])
-async def research_endpoint(request: ResearchRequest):
+@app.post("/api/research", response_model=ResearchResponse, tags=["Research"],
+          openapi_extra=RESEARCH_REQUEST_OPENAPI)
+async def research_endpoint(request: ResearchRequest = Depends(parse_research_request)):
     """
     Main research endpoint
     Processes research queries using the multi-agent workflow
@@ -251,36 +455,37 @@ async def research_endpoint(request: ResearchRequest):
     
     Returns:
         ResearchResponse with the generated report or error
+        (cache hits are returned as pre-serialized JSON, bypassing
+        response_model validation)
     """
-    logger.info(f"Research request received: {request.query}")
+    logger.info("Research request received: %s", request.query)
     
     try:
-        # Check cache first (if enabled)
         if request.use_cache:
-            cached_result = cache.get(request.query)
-            if cached_result:
-                return ResearchResponse(
-                    success=True,
-                    query=request.query,
-                    report=cached_result.get("report"),
-                    metadata=cached_result.get("metadata", {}),
-                    cached=True
-                )
-        
-        # Run the research workflow
-        logger.info(f"Running workflow for: {request.query}")
-        result = workflow.run(request.query)
+            # Cached result, the result of an identical in-flight request,
+            # or a fresh workflow run
+            entry, cached = await cache.get_or_compute(
+                request.query,
+                lambda: app.state.workflow.arun(request.query, request.report_type),
+                request.report_type
+            )
+            # The stored body names the query that filled the cache; a query
+            # that only matched after normalization gets its own response
+            if cached and entry.get("query") == request.query and "response_json" in entry:
+                return Response(content=entry["response_json"], media_type="application/json")
+            result = entry["data"]
+        else:
+            logger.info("Running workflow for: %s", request.query)
+            result = await app.state.workflow.arun(request.query, request.report_type)
+            cached = False
         
         if result["success"]:
-            # Cache the successful result
-            cache.set(request.query, result)
-            
             return ResearchResponse(
                 success=True,
                 query=request.query,
                 report=result["report"],
                 metadata=result["metadata"],
-                cached=False
+                cached=cached
             )
         else:
             # Workflow failed
@@ -293,116 +498,233 @@ async def research_endpoint(request: ResearchRequest):
             )
     
     except Exception as e:
-        logger.error(f"Error processing research request: {str(e)}")
+        logger.error("Error processing research request: %s", e)
         raise HTTPException(
             status_code=500,
             detail=f"Internal server error: {str(e)}"
         )
 
+@app.post("/api/research/stream", tags=["Research"], openapi_extra=RESEARCH_REQUEST_OPENAPI)
+async def research_stream_endpoint(request: ResearchRequest = Depends(parse_research_request)):
+    """
+    Streaming research endpoint
+    Sends the report as Server-Sent Events while the Writer generates it,
+    so the first text arrives long before the full report is done
+    
+    Args:
+        request: ResearchRequest containing the query and options
+    
+    Returns:
+        text/event-stream of report_chunk events followed by complete or error
+    """
+    logger.info("Streaming research request received: %s", request.query)
+    
+    def sse(event: Dict[str, Any]) -> bytes:
+        return b"data: " + orjson.dumps(event) + b"\n\n"
+    
+    async def event_stream():
+        chunks: asyncio.Queue = asyncio.Queue()
+        streamed = False
+        
+        def on_report_chunk(chunk: str):
+            nonlocal streamed
+            streamed = True
+            chunks.put_nowait(chunk)
+        
+        def run_workflow():
+            return app.state.workflow.arun(
+                request.query, request.report_type, on_report_chunk=on_report_chunk
+            )
+        
+        async def run_uncached():
+            return {"data": await run_workflow()}, False
+        
+        if request.use_cache:
+            # Cached result, the result of an identical in-flight request
+            # (from any endpoint), or a fresh workflow run
+            future = asyncio.ensure_future(
+                cache.get_or_compute(request.query, run_workflow, request.report_type)
+            )
+        else:
+            future = asyncio.ensure_future(run_uncached())
+        _research_tasks.add(future)
+        future.add_done_callback(_research_task_done)
+        future.add_done_callback(lambda _: chunks.put_nowait(_PROGRESS_DONE))
+        
+        while (chunk := await chunks.get()) is not _PROGRESS_DONE:
+            yield sse({"type": "report_chunk", "data": chunk})
+        
+        try:
+            entry, cached = future.result()
+        except Exception as e:
+            yield sse({"type": "error", "error": f"Workflow error: {str(e)}"})
+            return
+        
+        result = entry["data"]
+        if result["success"]:
+            # Reports that weren't streamed (cached, or shared with another
+            # request) go out in one piece
+            if not streamed:
+                yield sse({"type": "report_chunk", "data": result["report"]})
+            yield sse({"type": "complete", "cached": cached, "metadata": result["metadata"]})
+        else:
+            yield sse({
+                "type": "error",
+                "error": result.get("error", "Research failed"),
+                "failed_at_step": result.get("metadata", {}).get("failed_at_step")
+            })
+    
+    # Marked as already encoded so GZipMiddleware passes it through;
+    # gzip would buffer events and defeat the streaming
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Content-Encoding": "identity"}
+    )
+
 @app.delete("/api/cache", tags=["Cache"])
 async def clear_cache():
     """Clear the entire cache"""
-    cache.clear()
+    await cache.clear()
+    response_cache.clear()
+    semantic_cache.clear()
+    if result_disk_cache is not None:
+        result_disk_cache.clear()
     return {"message": "Cache cleared successfully", "stats": cache.stats()}
 
 @app.get("/api/cache/stats", tags=["Cache"])
 async def cache_stats():
     """Get cache statistics"""
-    return cache.stats()
+    return {
+        **cache.stats(),
+        "llm_responses": response_cache.stats(),
+        "semantic": semantic_cache.stats(),
+        "disk": result_disk_cache.stats() if result_disk_cache is not None else None
+    }
 
 # ============================================
 # WebSocket Endpoint for Real-time Updates
 # ============================================
 
-async def run_workflow_with_updates(query: str, websocket: WebSocket, manager):
+# Marks the end of a workflow's progress events
+_PROGRESS_DONE = object()
+
+# Workflow runs started for websocket and SSE clients. A run may be shared
+# with other requests, so it is never cancelled when its client stops waiting;
+# the references keep it alive until it finishes
+_research_tasks: Set[asyncio.Task] = set()
+
+
+def _research_task_done(task: asyncio.Task):
+    """Forget a finished workflow run, logging a failure nobody awaited"""
+    _research_tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.info("Research run ended with an error: %s", task.exception())
+
+@functools.lru_cache(maxsize=64)
+def progress_frame(step: str, message: str, progress: float) -> str:
     """
-    Run the research workflow with real-time progress updates
+    Encoded progress frame; the workflow only emits a handful of fixed
+    messages, so each one is built and encoded once and then reused
     """
-    try:
-        # Send initial research progress
+    return orjson.dumps({
+        "type": "progress",
+        "step": step,
+        "message": message,
+        "progress": progress
+    }).decode()
+
+# Characters per report_chunk frame when sending an already finished report
+REPORT_CHUNK_SIZE = 4096
+
+async def send_report_chunks(websocket: WebSocket, manager, report: str):
+    """Send a finished report as a series of report_chunk frames"""
+    for start in range(0, len(report), REPORT_CHUNK_SIZE):
         await manager.send_json(websocket, {
-            "type": "progress",
-            "step": "research",
-            "message": "🔍 Searching for information...",
-            "progress": 10
+            "type": "report_chunk",
+            "data": report[start:start + REPORT_CHUNK_SIZE]
         })
 
-        # Run the workflow in a thread to avoid blocking
-        loop = asyncio.get_event_loop()
-        with concurrent.futures.ThreadPoolExecutor() as executor:
-            # Start the workflow
-            future = loop.run_in_executor(executor, workflow.run, query)
-
-            # Send progress updates while waiting
-            progress_steps = [
-                (5, "research", "🔍 Connecting to search services..."),
-                (10, "research", "🔍 Searching for information..."),
-                (15, "research", "🔍 Gathering sources..."),
-                (20, "research", "🔍 Processing search results..."),
-                (30, "analyze", "🧠 Starting analysis..."),
-                (40, "analyze", "🧠 Analyzing findings..."),
-                (50, "analyze", "🧠 Synthesizing information..."),
-                (60, "analyze", "🧠 Extracting insights..."),
-                (70, "write", "✍️ Starting report generation..."),
-                (80, "write", "✍️ Writing report sections..."),
-                (90, "write", "✍️ Formatting final report..."),
-            ]
-
-            for seconds, step, message in progress_steps:
-                if future.done():
-                    break
-
-                await manager.send_json(websocket, {
-                    "type": "progress",
-                    "step": step,
-                    "message": message,
-                    "progress": (seconds / 45) * 100  # Estimate based on ~45 second total time
-                })
-
-                # Wait a bit before next update
-                await asyncio.sleep(3)
-
-                # Check if done
-                if future.done():
+async def run_workflow_with_updates(query: str, websocket: WebSocket, manager,
+                                    report_type: str = "detailed"):
+    """
+    Run the research workflow with real-time progress updates
+    Progress is pushed by the workflow as each step starts, not estimated,
+    and the report arrives as report_chunk frames while it is being written
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        progress_queue: asyncio.Queue = asyncio.Queue()
+        streamed = False
+
+        def on_progress(step: str, message: str, progress: float):
+            progress_queue.put_nowait(progress_frame(step, message, progress))
+
+        def on_report_chunk(chunk: str):
+            nonlocal streamed
+            streamed = True
+            progress_queue.put_nowait({"type": "report_chunk", "data": chunk})
+
+        # Start the workflow as a task on the event loop, sharing the run
+        # with any identical query already in progress
+        future = asyncio.ensure_future(cache.get_or_compute(
+            query,
+            lambda: app.state.workflow.arun(query, report_type, on_progress=on_progress,
+                                            on_report_chunk=on_report_chunk),
+            report_type
+        ))
+        _research_tasks.add(future)
+        future.add_done_callback(_research_task_done)
+        future.add_done_callback(lambda _: progress_queue.put_nowait(_PROGRESS_DONE))
+
+        # Forward progress events until the workflow finishes (with timeout)
+        deadline = loop.time() + 60  # 60 second timeout
+        try:
+            while True:
+                message = await asyncio.wait_for(
+                    progress_queue.get(),
+                    timeout=max(deadline - loop.time(), 0)
+                )
+                if message is _PROGRESS_DONE:
                     break
+                await manager.send_json(websocket, message)
 
-            # Get the result (with timeout)
-            try:
-                result = await asyncio.wait_for(
-                    asyncio.wrap_future(future),
-                    timeout=60  # 60 second timeout
-                )
+            entry, cached = future.result()
+            result = entry["data"]
 
-                if result["success"]:
-                    # Cache the result
-                    cache.set(query, result)
-
-                    # Send complete message
-                    await manager.send_json(websocket, {
-                        "type": "complete",
-                        "cached": False,
-                        "report": result["report"],
-                        "metadata": result["metadata"]
-                    })
-                else:
-                    await manager.send_json(websocket, {
-                        "type": "error",
-                        "error": result.get("error", "Research failed")
-                    })
+            if result["success"]:
+                # Reports that weren't streamed (cached, or shared with another
+                # request) still go out as chunks
+                if not streamed:
+                    await send_report_chunks(websocket, manager, result["report"])
 
-            except asyncio.TimeoutError:
+                # Send complete message; the client already has the report
                 await manager.send_json(websocket, {
-                    "type": "error",
-                    "error": "Research timeout - the process took too long"
+                    "type": "complete",
+                    "cached": cached,
+                    "metadata": result["metadata"]
                 })
-            except Exception as e:
+            else:
                 await manager.send_json(websocket, {
                     "type": "error",
-                    "error": str(e)
+                    "error": result.get("error", "Research failed")
                 })
 
+        except asyncio.TimeoutError:
+            # Only this client gives up; the run keeps going for any request
+            # sharing it and still fills the cache
+            await manager.send_json(websocket, {
+                "type": "error",
+                "error": "Research timeout - the process took too long"
+            })
+        except Exception as e:
+            await manager.send_json(websocket, {
+                "type": "error",
+                "error": str(e)
+            })
+
     except Exception as e:
-        logger.error(f"Workflow error: {str(e)}")
+        logger.error("Workflow error: %s", e)
         await manager.send_json(websocket, {
             "type": "error",
             "error": f"Workflow error: {str(e)}"
@@ -420,8 +742,9 @@ async def websocket_endpoint(websocket: WebSocket):
     try:
         while True:
             # Receive query from client
-            data = await websocket.receive_json()
+            data = orjson.loads(await websocket.receive_text())
             query = data.get("query", "")
+            report_type = data.get("report_type", "detailed")
             
             if not query:
                 await manager.send_json(websocket, {
@@ -430,7 +753,7 @@ async def websocket_endpoint(websocket: WebSocket):
                 })
                 continue
             
-            logger.info(f"WebSocket research request: {query}")
+            logger.info("WebSocket research request: %s", query)
             
             # Send initial acknowledgment
             await manager.send_json(websocket, {
@@ -440,23 +763,13 @@ async def websocket_endpoint(websocket: WebSocket):
                 "timestamp": datetime.now().isoformat()
             })
             
-            # Check cache first
-            cached_result = cache.get(query)
-            if cached_result:
-                await manager.send_json(websocket, {
-                    "type": "complete",
-                    "cached": True,
-                    "report": cached_result.get("report"),
-                    "metadata": cached_result.get("metadata", {})
-                })
-                continue
-            
             try:
-                # Run workflow asynchronously with progress updates
-                await run_workflow_with_updates(query, websocket, manager)
+                # Serve from cache, or run the workflow with progress updates
+                # (one lookup: get_or_compute checks the cache itself)
+                await run_workflow_with_updates(query, websocket, manager, report_type)
 
             except Exception as e:
-                logger.error(f"Error during research: {str(e)}")
+                logger.error("Error during research: %s", e)
                 await manager.send_json(websocket, {
                     "type": "error",
                     "error": str(e)
@@ -466,7 +779,7 @@ async def websocket_endpoint(websocket: WebSocket):
         manager.disconnect(websocket)
         logger.info("WebSocket client disconnected")
     except Exception as e:
-        logger.error(f"WebSocket error: {str(e)}")
+        logger.error("WebSocket error: %s", e)
         try:
             await manager.send_json(websocket, {
                 "type": "error",
@@ -480,6 +793,18 @@ async def websocket_endpoint(websocket: WebSocket):
 # Startup and Shutdown Events
 # ============================================
 
+async def warm_up_openai(client):
+    """Make a cheap request to open a pooled connection to the OpenAI API"""
+    try:
+        await client.models.list()
+        logger.info("OpenAI connection pool warmed up")
+        # Bring embeddings stored under a previous EMBEDDING_MODEL up to date
+        reembedded = await semantic_cache.reembed_stale(client)
+        if reembedded:
+            logger.info("Re-embedded %d cached queries", reembedded)
+    except Exception as e:
+        logger.warning("OpenAI warm-up failed: %s", e)
+
 @app.on_event("startup")
 async def startup_event():
     """Run on server startup"""
@@ -490,15 +815,40 @@ async def startup_event():
         logger.error("❌ Invalid configuration. Please check your .env file")
         raise RuntimeError("Invalid configuration")
     
+    # Keys can't change while the server runs, so /health reuses this
+    app.state.apis_configured = {
+        "openai": bool(settings.OPENAI_API_KEY),
+        "tavily": bool(settings.TAVILY_API_KEY)
+    }
+    
+    # Route every run_in_executor/to_thread call through the shared pool
+    asyncio.get_running_loop().set_default_executor(EXECUTOR)
+    
+    # Build the API clients and the workflow once; every request reuses them
+    from agents._client import client as openai_client
+    from tavily import AsyncTavilyClient
+    app.state.openai = openai_client
+    app.state.tavily = AsyncTavilyClient(api_key=settings.TAVILY_API_KEY)
+    app.state.workflow = ResearchWorkflow.shared(
+        openai_client=app.state.openai,
+        tavily_client=app.state.tavily
+    )
+    
+    # Open the OpenAI connection in the background so the first research
+    # request doesn't pay for the TLS handshake
+    app.state.warmup = asyncio.create_task(warm_up_openai(app.state.openai))
+    
     logger.info("✅ API started successfully")
-    logger.info(f"📚 Documentation available at: http://localhost:8000/docs")
+    logger.info("📚 Documentation available at: http://localhost:8000/docs")
 
 @app.on_event("shutdown")
 async def shutdown_event():
     """Run on server shutdown"""
     logger.info("Shutting down API...")
     # Save cache stats before shutdown
-    logger.info(f"Final cache stats: {cache.stats()}")
+    logger.info("Final cache stats: %s", cache.stats())
+    await app.state.openai.close()
+    EXECUTOR.shutdown(wait=False)
 
 # ============================================
 # Run the server
@@ -511,5 +861,6 @@ if __name__ == "__main__":
         host="0.0.0.0",
         port=8000,
         reload=True,  # Auto-reload on code changes
-        log_level="info"
+        log_level="info",
+        ws_per_message_deflate=True  # Compress websocket frames (report chunks)
     )
\ No newline at end of file
@@ -8,7 +8,7 @@ import requests
 import json
 import asyncio
 import websockets
-from datetime import datetime
+from time import perf_counter
 from typing import Dict, Any
 
 # API base URL
@@ -78,14 +78,14 @@ class APITestClient:
         }
         
         print("   ⏳ Sending request (this may take 30-40 seconds)...")
-        start_time = datetime.now()
+        start_time = perf_counter()
         
         response = self.session.post(
             f"{self.base_url}/api/research",
             json=payload
         )
         
-        duration = (datetime.now() - start_time).total_seconds()
+        duration = perf_counter() - start_time
         
         if response.status_code == 200:
             data = response.json()
@@ -138,24 +138,35 @@ class APITestClient:
                 await websocket.send(json.dumps({"query": query}))
                 print("   📤 Query sent")
                 
-                # Receive updates
-                while True:
+                # Receive updates; the report arrives as report_chunk events
+                report_chunks = []
+                finished = False
+                while not finished:
                     message = await websocket.recv()
                     data = json.loads(message)
+                    # Events queued back to back arrive together in one batch frame
+                    events = data["events"] if data.get("type") == "batch" else [data]
                     
-                    if data.get("type") == "status":
-                        print(f"   📍 Status: {data.get('message')}")
-                    elif data.get("type") == "progress":
-                        print(f"   ⏳ Progress: {data.get('step')} - {data.get('message')} ({data.get('progress'):.0f}%)")
-                    elif data.get("type") == "complete":
-                        print(f"   ✅ Complete! Cached: {data.get('cached')}")
-                        if data.get("report"):
-                            print(f"   Report length: {len(data['report'])} characters")
-                        break
-                    elif data.get("type") == "error":
-                        print(f"   ❌ Error: {data.get('error')}")
-                        break
+                    for data in events:
+                        if data.get("type") == "status":
+                            print(f"   📍 Status: {data.get('message')}")
+                        elif data.get("type") == "progress":
+                            print(f"   ⏳ Progress: {data.get('step')} - {data.get('message')} ({data.get('progress'):.0f}%)")
+                        elif data.get("type") == "report_chunk":
+                            report_chunks.append(data["data"])
+                        elif data.get("type") == "complete":
+                            print(f"   ✅ Complete! Cached: {data.get('cached')}")
+                            finished = True
+                            break
+                        elif data.get("type") == "error":
+                            print(f"   ❌ Error: {data.get('error')}")
+                            return False
                 
+                report = "".join(report_chunks)
+                if not report:
+                    print("   ❌ No report received")
+                    return False
+                print(f"   Report length: {len(report)} characters ({len(report_chunks)} chunks)")
                 return True
         except Exception as e:
             print(f"❌ WebSocket test failed: {str(e)}")
@@ -10,72 +10,52 @@ sys.path.append(str(Path(__file__).parent))
 
 from workflow.research_graph import ResearchWorkflow
 from config.settings import settings
-import json
+import functools
+import orjson
 from datetime import datetime
+from time import perf_counter
 
 
 def test_individual_agents():
-    """Test each agent individually first"""
+    """Test each agent through one run of the workflow"""
     print("\n" + "="*60)
     print("🧪 TESTING INDIVIDUAL AGENTS")
     print("="*60)
     
-    from agents.researcher import ResearcherAgent
-    from agents.analyzer import AnalyzerAgent
-    from agents.writer import WriterAgent
+    workflow = ResearchWorkflow.shared()
+    result = workflow.run("What is LangGraph?", report_type="summary")
     
-    # Test Researcher
-    print("\n1️⃣ Testing Researcher Agent...")
-    researcher = ResearcherAgent(settings.TAVILY_API_KEY)
-    search_results = researcher.search("What is LangGraph?", max_results=2)
+    # One entry per node that ran
+    for step, status in result["metadata"].get("step_status", {}).items():
+        icon = "✅" if status == "success" else "❌"
+        print(f"   {icon} {step}: {status}")
     
-    if search_results["status"] == "success":
-        print(f"   ✅ Researcher working - Found {len(search_results['results']['sources'])} sources")
-    else:
-        print(f"   ❌ Researcher failed: {search_results.get('error')}")
-        return False
-    
-    # Test Analyzer
-    print("\n2️⃣ Testing Analyzer Agent...")
-    analyzer = AnalyzerAgent(settings.OPENAI_API_KEY)
-    formatted_search = researcher.format_for_next_agent(search_results)
-    analysis = analyzer.analyze(formatted_search, "What is LangGraph?")
-    
-    if analysis["status"] == "success":
-        print(f"   ✅ Analyzer working - Used {analysis.get('tokens_used', 0)} tokens")
-    else:
-        print(f"   ❌ Analyzer failed: {analysis.get('error')}")
+    if not result["success"]:
+        print(f"   ❌ Workflow failed: {result.get('error')}")
         return False
     
-    # Test Writer
-    print("\n3️⃣ Testing Writer Agent...")
-    writer = WriterAgent(settings.OPENAI_API_KEY)
-    formatted_analysis = analyzer.format_for_next_agent(analysis)
-    report = writer.write_report(
-        "What is LangGraph?",
-        formatted_search,
-        formatted_analysis,
-        report_type="summary"
-    )
-    
-    if report["status"] == "success":
-        print(f"   ✅ Writer working - Generated {report.get('word_count', 0)} words")
-    else:
-        print(f"   ❌ Writer failed: {report.get('error')}")
+    if result["metadata"]["sources_found"] == 0:
+        print("   ❌ Researcher found no sources")
         return False
     
     print("\n✅ All individual agents working correctly!")
     return True
 
 
+@functools.lru_cache(maxsize=1)
+def _run_stamp() -> str:
+    """Timestamp for this run's output files, formatted once at the first save"""
+    return datetime.now().strftime('%Y%m%d_%H%M%S')
+
+
 def test_complete_workflow():
     """Test the complete workflow with multiple queries"""
     print("\n" + "="*60)
     print("🔬 TESTING COMPLETE WORKFLOW")
     print("="*60)
     
-    # Create workflow
-    workflow = ResearchWorkflow()
+    # Reuse the process-wide workflow for every query
+    workflow = ResearchWorkflow.shared()
     
     # Test queries - from simple to complex
     test_queries = [
@@ -106,9 +86,9 @@ def test_complete_workflow():
         print(f"{'='*60}")
         
         # Run workflow
-        start = datetime.now()
+        start = perf_counter()
         result = workflow.run(test["query"])
-        duration = (datetime.now() - start).total_seconds()
+        duration = perf_counter() - start
         
         # Store result
         test_result = {
@@ -136,7 +116,7 @@ def test_complete_workflow():
             print(f"   {result['report'][:200]}...")
             
             # Save full report
-            filename = f"test_report_{test['complexity']}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.md"
+            filename = f"test_report_{test['complexity']}_{_run_stamp()}.md"
             with open(filename, "w") as f:
                 f.write(f"# Test Report: {test['complexity'].upper()}\n\n")
                 f.write(f"**Query:** {test['query']}\n\n")
@@ -205,9 +185,9 @@ def generate_test_report(results):
     print("\n" + "="*60)
     
     # Save test report
-    report_filename = f"test_summary_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-    with open(report_filename, "w") as f:
-        json.dump(results, f, indent=2, default=str)
+    report_filename = f"test_summary_{_run_stamp()}.json"
+    with open(report_filename, "wb") as f:
+        f.write(orjson.dumps(results, option=orjson.OPT_INDENT_2, default=str))
     print(f"\n💾 Test summary saved to: {report_filename}")
     
     return all(r["success"] for r in results)
@@ -0,0 +1,10 @@
+"""
+Shared pytest setup: keep the module-level caches off disk, so importing
+cache or main during the tests never creates .llm_cache.db in the cwd
+"""
+
+import os
+
+# Set before any test module imports config.settings
+os.environ["LLM_CACHE_PATH"] = ""
+os.environ["RESEARCH_CACHE_DIR"] = ""
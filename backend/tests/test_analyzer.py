@@ -0,0 +1,38 @@
+"""
+Offline tests for the Analyzer's response parsing
+No API keys or network needed: python -m pytest tests/
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.analyzer import AnalyzerAgent
+
+
+def _key_points(analysis: str):
+    analyzer = AnalyzerAgent("test-key", client=object())
+    return analyzer.extract_key_points({"status": "success", "analysis": analysis})
+
+
+def test_key_points_stop_at_numbered_heading():
+    analysis = (
+        "1. KEY FINDINGS:\n"
+        "- LangGraph builds agent graphs\n"
+        "- 2024 saw its first stable release\n"
+        "2. PATTERNS: stuff\n"
+        "3. GAPS: more stuff"
+    )
+
+    assert _key_points(analysis) == [
+        "LangGraph builds agent graphs",
+        "2024 saw its first stable release"
+    ]
+
+
+def test_key_points_strip_numbered_markers_only():
+    analysis = "## Key Findings\n1. First finding\n2) Second finding\n3.5 million users\n\n## Patterns\n- p"
+
+    assert _key_points(analysis) == ["First finding", "Second finding", "3.5 million users"]
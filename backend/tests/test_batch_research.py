@@ -0,0 +1,139 @@
+"""
+Offline tests for multi-query research: several queries per Analyzer prompt
+and Batch API output parsing
+No API keys or network needed: python -m pytest tests/
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+import asyncio
+
+import orjson
+
+from agents.analyzer import AnalyzerAgent
+from workflow.batch_research import BatchResearchWorkflow
+
+
+class FakeChat:
+    """Stands in for an AsyncOpenAI client, answering every call with one reply"""
+
+    def __init__(self, reply: dict):
+        self.calls = []
+
+        async def create(**kwargs):
+            self.calls.append(kwargs)
+            return SimpleNamespace(
+                choices=[SimpleNamespace(message=SimpleNamespace(content=orjson.dumps(reply).decode()))],
+                usage=SimpleNamespace(total_tokens=100, prompt_tokens=80, prompt_tokens_details=None)
+            )
+
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=create))
+
+
+def test_analyze_batch_sends_one_prompt_for_all_queries():
+    client = FakeChat({"1": {"analysis": "first", "key_points": ["a", "b"]}})
+    analyzer = AnalyzerAgent("test-key", client=client)
+
+    results = asyncio.run(analyzer.analyze_batch([
+        ("results one", "batch question one"),
+        ("results two", "batch question two")
+    ]))
+
+    assert len(client.calls) == 1
+    assert results[0]["status"] == "success"
+    assert results[0]["analysis"] == "first"
+    assert results[0]["key_points"] == ["a", "b"]
+    # The call's tokens are split over the queries it answered
+    assert results[0]["tokens_used"] == 50
+    # The model skipped the second question
+    assert results[1]["status"] == "error"
+    assert results[1]["original_query"] == "batch question two"
+
+
+def test_run_many_without_batch_api_analyzes_in_shared_prompts():
+    async def asearch(query, max_results=5):
+        return {"status": "success", "results": {"sources": [{"url": query}]}}
+
+    async def write_report(query, search_results, analysis, report_type):
+        return {"status": "success", "report": f"Report on {query}", "word_count": 3, "tokens_used": 1}
+
+    async def generate_title(query):
+        return f"Title for {query}"
+
+    client = FakeChat({
+        "1": {"analysis": "one", "key_points": []},
+        "2": {"analysis": "two", "key_points": []}
+    })
+
+    # Agents are replaced with fakes; skip creating the real ones
+    workflow = object.__new__(BatchResearchWorkflow)
+    workflow.search_semaphore = asyncio.Semaphore(2)
+    workflow.researcher = SimpleNamespace(asearch=asearch, format_for_next_agent=lambda results: "SR")
+    workflow.analyzer = AnalyzerAgent("test-key", client=client)
+    workflow.writer = SimpleNamespace(write_report=write_report, generate_title=generate_title)
+
+    queries = ["shared prompt query one", "shared prompt query two"]
+    results = asyncio.run(workflow.run_many(queries, "summary", use_batch_api=False))
+
+    assert len(client.calls) == 1
+    assert [result["success"] for result in results] == [True, True]
+    assert results[1]["report"] == "Report on shared prompt query two"
+    assert results[1]["metadata"]["step_status"] == {
+        "research": "success", "analyze": "success", "write": "success"
+    }
+
+
+class FakeBatchClient:
+    """Stands in for the files and batches APIs with a finished batch"""
+
+    def __init__(self, output_lines, error_lines):
+        contents = {
+            "out": "\n".join(orjson.dumps(line).decode() for line in output_lines),
+            "err": "\n".join(orjson.dumps(line).decode() for line in error_lines)
+        }
+
+        async def create_file(file, purpose):
+            return SimpleNamespace(id="in")
+
+        async def file_content(file_id):
+            return SimpleNamespace(text=contents[file_id])
+
+        async def create_batch(**kwargs):
+            return SimpleNamespace(id="batch", status="completed",
+                                   output_file_id="out", error_file_id="err")
+
+        self.files = SimpleNamespace(create=create_file, content=file_content)
+        self.batches = SimpleNamespace(create=create_batch)
+
+
+def test_run_batch_parses_output_and_errors():
+    output_lines = [{
+        "custom_id": "analyze-0",
+        "response": {
+            "status_code": 200,
+            "body": {
+                "choices": [{"message": {"content": "analysis"}}],
+                "usage": {"total_tokens": 42}
+            }
+        }
+    }]
+    error_lines = [{
+        "custom_id": "analyze-1",
+        "response": {"status_code": 400, "body": {"error": {"message": "bad request"}}}
+    }]
+
+    # Only the client is needed; skip creating the agents
+    workflow = object.__new__(BatchResearchWorkflow)
+    workflow.openai_client = FakeBatchClient(output_lines, error_lines)
+    requests = {"analyze-0": {}, "analyze-1": {}, "analyze-2": {}}
+
+    outputs = asyncio.run(workflow._run_batch(requests))
+
+    assert outputs["analyze-0"] == {"content": "analysis", "tokens_used": 42}
+    assert "bad request" in outputs["analyze-1"]["error"]
+    assert outputs["analyze-2"] == {"error": "missing from batch output"}
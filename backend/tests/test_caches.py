@@ -0,0 +1,122 @@
+"""
+Offline tests for the semantic cache: similarity thresholds, query
+normalization and the on-disk embedding store
+No API keys or network needed: python -m pytest tests/
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+import asyncio
+import math
+
+import numpy as np
+
+from cache import EmbeddingStore, SemanticCache
+
+
+def _unit(angle: float) -> np.ndarray:
+    """2-d unit vector; its cosine similarity to [1, 0] is cos(angle)"""
+    return np.array([math.cos(angle), math.sin(angle)], dtype=np.float32)
+
+
+class FakeEmbeddings:
+    """Stands in for client.embeddings, recording every batch it is sent"""
+
+    DIMENSIONS = 16
+
+    def __init__(self):
+        self.calls = []
+        self.embedded = 0
+
+    async def create(self, model, input):
+        self.calls.append(list(input))
+        # An orthogonal direction per text, so different queries never match
+        data = []
+        for i in range(len(input)):
+            embedding = [0.0] * self.DIMENSIONS
+            embedding[self.embedded % self.DIMENSIONS] = 1.0
+            self.embedded += 1
+            data.append(SimpleNamespace(index=i, embedding=embedding))
+        return SimpleNamespace(data=data)
+
+
+def test_semantic_lookup_respects_threshold():
+    cache = SemanticCache()
+    cache.insert("report:summary", _unit(0.0), {"report": "cached"})
+
+    close = _unit(math.acos(0.95))
+    far = _unit(math.acos(0.90))
+
+    assert cache.lookup("report:summary", close) == {"report": "cached"}
+    assert cache.lookup("report:summary", far) is None
+    assert cache.lookup("report:summary", far, threshold=0.87) == {"report": "cached"}
+    assert cache.lookup("report:detailed", close) is None
+
+
+def test_embedding_shared_only_by_normalized_queries():
+    cache = SemanticCache()
+    client = SimpleNamespace(embeddings=FakeEmbeddings())
+
+    async def scenario():
+        first = await cache.embed(client, "What is LangGraph?")
+        same = await cache.embed(client, "  what is   LANGGRAPH ")
+        return first, same
+
+    first, same = asyncio.run(scenario())
+
+    assert client.embeddings.calls == [["what is langgraph"]]
+    assert np.array_equal(first, same)
+
+
+def test_nearly_identical_queries_are_embedded_separately():
+    """A one-character difference can change the question entirely"""
+    cache = SemanticCache()
+    client = SimpleNamespace(embeddings=FakeEmbeddings())
+    queries = [
+        "What changed in the Python 3.12 release notes?",
+        "What changed in the Python 3.13 release notes?"
+    ]
+
+    old, new = asyncio.run(cache.embed_many(client, queries))
+
+    assert client.embeddings.calls == [[SemanticCache.normalize(query) for query in queries]]
+    assert float(old @ new) < SemanticCache.THRESHOLD
+
+
+
+def test_embeddings_persist_across_caches(tmp_path):
+    path = str(tmp_path / "embeddings.db")
+    first = SimpleNamespace(embeddings=FakeEmbeddings())
+    stored = asyncio.run(SemanticCache(EmbeddingStore(path)).embed(first, "What is LangGraph?"))
+
+    # A new cache on the same file, as after a restart
+    second = SimpleNamespace(embeddings=FakeEmbeddings())
+    loaded = asyncio.run(SemanticCache(EmbeddingStore(path)).embed(second, "What is LangGraph?"))
+
+    assert second.embeddings.calls == []
+    assert np.array_equal(stored, loaded)
+
+
+def test_embeddings_from_another_model_are_stale(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.db"))
+    store.set_many("old-model", [("what is langgraph", _unit(0.0))])
+
+    assert store.get("what is langgraph", SemanticCache.EMBEDDING_MODEL) is None
+    assert store.stale_queries(SemanticCache.EMBEDDING_MODEL) == ["what is langgraph"]
+
+
+def test_reembed_stale_replaces_old_model_embeddings(tmp_path):
+    store = EmbeddingStore(str(tmp_path / "embeddings.db"))
+    store.set_many("old-model", [("what is langgraph", _unit(0.0))])
+    cache = SemanticCache(store)
+    client = SimpleNamespace(embeddings=FakeEmbeddings())
+
+    assert asyncio.run(cache.reembed_stale(client)) == 1
+    assert client.embeddings.calls == [["what is langgraph"]]
+    assert store.get("what is langgraph", SemanticCache.EMBEDDING_MODEL) is not None
+    assert store.stale_queries(SemanticCache.EMBEDDING_MODEL) == []
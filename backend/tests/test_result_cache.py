@@ -0,0 +1,127 @@
+"""
+Offline tests for the API's research-result cache: single-flight runs
+shared across requests and endpoints, and cached responses
+No API keys or network needed: python -m pytest tests/
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from types import SimpleNamespace
+import asyncio
+
+import httpx
+import orjson
+from fastapi.testclient import TestClient
+
+import main
+from main import CacheManager
+
+
+def test_normalized_cache_hit_reports_the_request_query():
+    runs = []
+
+    async def arun(query, report_type):
+        runs.append(query)
+        return {"success": True, "report": "FastAPI is a web framework", "metadata": {}}
+
+    # Not started with "with", so the startup event doesn't build the real workflow
+    main.app.state.workflow = SimpleNamespace(arun=arun)
+    client = TestClient(main.app)
+
+    def ask(query):
+        response = client.post("/api/research", json={"query": query, "report_type": "summary"})
+        assert response.status_code == 200
+        return response.json()
+
+    first = ask("  What is FastAPI caching?  ")
+    reworded = ask("what is   fastapi caching")
+    repeated = ask("What is FastAPI caching?")
+
+    assert runs == ["What is FastAPI caching?"]
+    assert first["cached"] is False
+    assert reworded["query"] == "what is   fastapi caching"
+    assert reworded["cached"] is True
+    assert reworded["report"] == "FastAPI is a web framework"
+    assert repeated["query"] == "What is FastAPI caching?"
+    assert repeated["cached"] is True
+
+
+def test_get_or_compute_runs_once_for_concurrent_requests():
+    cache = CacheManager(ttl_hours=1)
+    runs = 0
+
+    async def compute():
+        nonlocal runs
+        runs += 1
+        await asyncio.sleep(0.01)
+        return {"success": True, "report": "text", "metadata": {}}
+
+    async def scenario():
+        concurrent = await asyncio.gather(*(
+            cache.get_or_compute("What is LangGraph?", compute, "summary")
+            for _ in range(3)
+        ))
+        later = await cache.get_or_compute("what is langgraph", compute, "summary")
+        return concurrent, later
+
+    concurrent, later = asyncio.run(scenario())
+
+    assert runs == 1
+    assert cache.coalesced == 2
+    assert all(entry["data"]["report"] == "text" for entry, _ in concurrent)
+    assert [cached for _, cached in concurrent] == [False, False, False]
+    assert later[1] is True
+
+
+def test_get_or_compute_does_not_cache_failures():
+    cache = CacheManager(ttl_hours=1)
+
+    async def fail():
+        return {"success": False, "error": "boom"}
+
+    async def scenario():
+        await cache.get_or_compute("q", fail)
+        return await cache.get_or_compute("q", fail)
+
+    entry, cached = asyncio.run(scenario())
+
+    assert cached is False
+    assert entry["data"]["error"] == "boom"
+
+
+def test_concurrent_sse_requests_share_one_run():
+    runs = []
+
+    async def arun(query, report_type, on_report_chunk=None):
+        runs.append(query)
+        await asyncio.sleep(0.05)
+        if on_report_chunk is not None:
+            on_report_chunk("Shared ")
+            on_report_chunk("report")
+        return {"success": True, "report": "Shared report", "metadata": {}}
+
+    main.app.state.workflow = SimpleNamespace(arun=arun)
+    body = {"query": "What is server-sent events coalescing?", "report_type": "summary"}
+
+    async def scenario():
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            return await asyncio.gather(*(
+                client.post("/api/research/stream", json=body) for _ in range(2)
+            ))
+
+    responses = asyncio.run(scenario())
+
+    assert runs == [body["query"]]
+    for response in responses:
+        events = [
+            orjson.loads(frame.removeprefix("data: "))
+            for frame in response.text.split("\n\n") if frame
+        ]
+        report = "".join(event["data"] for event in events if event["type"] == "report_chunk")
+        assert report == "Shared report"
+        assert events[-1]["type"] == "complete"
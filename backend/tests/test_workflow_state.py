@@ -0,0 +1,55 @@
+"""
+Offline tests for the workflow's state handling
+No API keys or network needed: python -m pytest tests/
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from collections import deque
+
+from workflow.research_graph import (
+    MAX_MESSAGES, _deque_extend, merge_update, new_research_state
+)
+
+
+def _message(i: int):
+    return ("info", "step %d", (i,))
+
+
+def test_deque_extend_leaves_old_value_unchanged():
+    """The reducer may be applied to the same channel value more than once"""
+    old = deque([_message(0)], maxlen=MAX_MESSAGES)
+    first = _deque_extend(old, [_message(1)])
+    second = _deque_extend(old, [_message(1)])
+
+    assert list(old) == [_message(0)]
+    assert list(first) == list(second) == [_message(0), _message(1)]
+
+
+def test_deque_extend_keeps_newest_messages():
+    messages = _deque_extend([], [_message(i) for i in range(MAX_MESSAGES + 10)])
+
+    assert len(messages) == MAX_MESSAGES
+    assert messages[0] == _message(10)
+    assert messages[-1] == _message(MAX_MESSAGES + 9)
+
+
+def test_merge_update_appends_messages():
+    state = new_research_state("What is LangGraph?", "summary")
+    merge_update(state, {"messages": [_message(1)]})
+    merge_update(state, {"messages": [_message(2)], "error": "boom"})
+
+    assert list(state["messages"])[1:] == [_message(1), _message(2)]
+    assert state["error"] == "boom"
+
+
+def test_merge_update_merges_step_status():
+    state = new_research_state("What is LangGraph?", "summary")
+    merge_update(state, {"step_status": {"research": "success"}})
+    merge_update(state, {"step_status": {"analyze": "error"}})
+
+    assert state["step_status"] == {"research": "success", "analyze": "error"}
@@ -0,0 +1,45 @@
+"""
+Offline tests for the Writer's streamed analyze-and-write response parsing
+No API keys or network needed: python -m pytest tests/
+"""
+
+import sys
+import os
+
+# Add parent directory to path so we can import our modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import json
+
+from agents.writer import _ReportFieldStream
+
+
+def _feed(response: str, size: int):
+    stream = _ReportFieldStream()
+    text = "".join(stream.feed(response[i:i + size]) for i in range(0, len(response), size))
+    return stream, text
+
+
+def test_report_field_stream_decodes_split_escapes():
+    report = 'Line 1\n"quoted" \\ back — emoji \U0001F600 tab\t end'
+    # ensure_ascii writes the emoji as a \uXXXX surrogate pair, so the
+    # chunk sizes below split escape sequences in different places
+    response = json.dumps({"analysis": '"report": "decoy"', "report": report, "title": "T"})
+
+    for size in range(1, 8):
+        stream, text = _feed(response, size)
+        assert text == report
+        assert stream.done
+
+
+def test_report_field_stream_keeps_only_a_short_tail():
+    analysis = "A long analysis of the sources. " * 500
+    response = json.dumps({"analysis": analysis, "report": "body " * 500})
+
+    stream = _ReportFieldStream()
+    longest = 0
+    for i in range(0, len(response), 4):
+        stream.feed(response[i:i + 4])
+        longest = max(longest, len(stream.pending))
+
+    assert longest <= _ReportFieldStream.SEARCH_WINDOW + 4
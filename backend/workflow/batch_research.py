@@ -0,0 +1,351 @@
+# backend/workflow/batch_research.py
+"""
+Batch Research Workflow: Runs many research queries at once
+Searches run concurrently, then every analysis and every report is sent to
+OpenAI's Batch API as one job each (half the token price, processed in parallel).
+Without the Batch API, several queries share each Analyzer prompt instead and
+the reports are written right away.
+"""
+
+from typing import Dict, List, Any
+from time import perf_counter
+import asyncio
+import orjson
+
+# Import the single-query workflow
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from workflow.research_graph import (
+    ResearchWorkflow, ResearchState, merge_update, new_research_state
+)
+
+# Seconds between batch status checks
+POLL_INTERVAL = 10
+
+# Queries analyzed together in one Analyzer prompt when the Batch API isn't used
+PROMPT_BATCH_SIZE = 5
+
+# Batch statuses after which the job will not change any more
+_TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+
+def _mark_step(state: ResearchState, step: str):
+    """Record whether a batched step succeeded, as the graph nodes do"""
+    state["step_status"][step] = "error" if state["error"] else "success"
+
+
+class BatchResearchWorkflow(ResearchWorkflow):
+    """
+    Research workflow for offline multi-query runs (test harness, report generation).
+    Results have the same shape as ResearchWorkflow.arun, one per query.
+    """
+
+    def __init__(self, max_concurrency: int = 10, **kwargs):
+        """
+        Initialize the workflow
+
+        Args:
+            max_concurrency: Maximum number of searches in flight at once
+            **kwargs: Passed on to ResearchWorkflow
+        """
+        super().__init__(**kwargs)
+        # Cap concurrent Tavily calls to stay within its rate limits
+        self.search_semaphore = asyncio.Semaphore(max_concurrency)
+
+    async def run_many(self, queries: List[str], report_type: str = "detailed",
+                       use_batch_api: bool = True) -> List[Dict[str, Any]]:
+        """
+        Research several questions, batching the OpenAI calls
+        A single query goes through the normal workflow, since a batch job
+        only pays off when there is something to parallelize
+
+        Args:
+            queries: Research questions to investigate
+            report_type: "detailed", "summary", or "executive"
+            use_batch_api: Send the OpenAI calls through the Batch API (half the
+                price, but a job can take minutes to hours). False analyzes up to
+                PROMPT_BATCH_SIZE queries per prompt and writes the reports at once
+
+        Returns:
+            List of results in the same order as queries
+        """
+        if len(queries) == 1:
+            return [await self.arun(queries[0], report_type)]
+
+        print(f"\n{'='*60}")
+        print(f"🔬 STARTING BATCH RESEARCH WORKFLOW ({len(queries)} queries)")
+        print(f"{'='*60}")
+
+        start_time = perf_counter()
+
+        states: List[ResearchState] = [
+            new_research_state(query, report_type)
+            for query in queries
+        ]
+
+        # Step 1: all searches concurrently
+        await asyncio.gather(*(self._search(state) for state in states))
+
+        if use_batch_api:
+            # Step 2: one batch job with every analysis
+            await self._analyze_all([state for state in states if not state["error"]])
+
+            # Step 3: one batch job with every report and title
+            await self._write_all([state for state in states if not state["error"]])
+        else:
+            # Step 2: a few queries per Analyzer prompt
+            await self._analyze_in_prompts([state for state in states if not state["error"]])
+
+            # Step 3: every report and title concurrently
+            await asyncio.gather(*(self._write(state) for state in states if not state["error"]))
+
+        duration = perf_counter() - start_time
+        print(f"\n✅ BATCH WORKFLOW FINISHED in {duration:.1f} seconds")
+
+        # Every query shares the wall time of the whole batch
+        return [
+            self._build_result(state["research_query"], report_type, state, duration)
+            for state in states
+        ]
+
+    async def _search(self, state: ResearchState) -> ResearchState:
+        """Run the research node for one query within the concurrency cap"""
+        async with self.search_semaphore:
+            return merge_update(state, await self.research_node(state))
+
+    async def _analyze_all(self, states: List[ResearchState]):
+        """
+        Analyze the search results of every state in a single batch job
+        """
+        if not states:
+            return
+
+        requests = {}
+        for i, state in enumerate(states):
+            state["current_step"] = "analyze"
+            state["formatted_search"] = self.researcher.format_for_next_agent(state["search_results"])
+            requests[f"analyze-{i}"] = self.analyzer.build_request(
+                state["formatted_search"], state["research_query"]
+            )
+
+        try:
+            outputs = await self._run_batch(requests)
+        except Exception as e:
+            for state in states:
+                state["error"] = f"Analysis batch failed: {str(e)}"
+                state["messages"].append(("error", "❌ Analysis failed: %s", (state["error"],)))
+                _mark_step(state, "analyze")
+            return
+
+        for i, state in enumerate(states):
+            output = outputs[f"analyze-{i}"]
+            try:
+                if "error" in output:
+                    raise RuntimeError(output["error"])
+                state["analysis"] = self.analyzer.parse_analysis(
+                    output["content"], state["research_query"], output["tokens_used"]
+                )
+                state["messages"].append(("info", "✅ Analysis completed successfully", ()))
+            except Exception as e:
+                state["error"] = f"Analysis failed: {str(e)}"
+                state["messages"].append(("error", "❌ Analysis failed: %s", (state["error"],)))
+            _mark_step(state, "analyze")
+
+    async def _write_all(self, states: List[ResearchState]):
+        """
+        Write the report and title of every state in a single batch job
+        """
+        if not states:
+            return
+
+        requests = {}
+        for i, state in enumerate(states):
+            state["current_step"] = "write"
+            query = state["research_query"]
+            requests[f"write-{i}"] = self.writer.build_request(
+                query,
+                state["formatted_search"],
+                self.analyzer.format_for_next_agent(state["analysis"]),
+                state["report_type"]
+            )
+            requests[f"title-{i}"] = self.writer.build_title_request(query)
+
+        try:
+            outputs = await self._run_batch(requests)
+        except Exception as e:
+            for state in states:
+                state["error"] = f"Report batch failed: {str(e)}"
+                state["messages"].append(("error", "❌ Report generation failed: %s", (state["error"],)))
+                _mark_step(state, "write")
+            return
+
+        for i, state in enumerate(states):
+            query = state["research_query"]
+            output = outputs[f"write-{i}"]
+            if "error" in output:
+                state["error"] = f"Report generation failed: {output['error']}"
+                state["messages"].append(("error", "❌ Report generation failed: %s", (state["error"],)))
+                _mark_step(state, "write")
+                continue
+
+            report = self.writer.report_result(
+                query, output["content"], state["report_type"], output["tokens_used"]
+            )
+            title = outputs[f"title-{i}"]
+            report["title"] = (
+                f"Research Report: {query[:50]}" if "error" in title
+                else title["content"].strip()
+            )
+            state["final_report"] = report
+            state["messages"].append(("info", "✅ Report completed: %d words", (report["word_count"],)))
+            _mark_step(state, "write")
+
+    async def _analyze_in_prompts(self, states: List[ResearchState]):
+        """
+        Analyze the search results of every state, PROMPT_BATCH_SIZE queries
+        per Analyzer call (AnalyzerAgent.analyze_batch), the calls running concurrently
+        """
+        for state in states:
+            state["current_step"] = "analyze"
+            state["formatted_search"] = self.researcher.format_for_next_agent(state["search_results"])
+
+        groups = [
+            states[start:start + PROMPT_BATCH_SIZE]
+            for start in range(0, len(states), PROMPT_BATCH_SIZE)
+        ]
+        analyses = await asyncio.gather(*(
+            self.analyzer.analyze_batch(
+                [(state["formatted_search"], state["research_query"]) for state in group]
+            )
+            for group in groups
+        ))
+
+        for group, group_analyses in zip(groups, analyses):
+            for state, analysis in zip(group, group_analyses):
+                state["analysis"] = analysis
+                if analysis["status"] == "success":
+                    state["formatted_analysis"] = self.analyzer.format_for_next_agent(analysis)
+                    state["messages"].append(("info", "✅ Analysis completed successfully", ()))
+                else:
+                    state["error"] = analysis.get("error", "Unknown error")
+                    state["messages"].append(("error", "❌ Analysis failed: %s", (state["error"],)))
+                _mark_step(state, "analyze")
+
+    async def _write(self, state: ResearchState):
+        """Write the report and title of one state with regular (non-batch) calls"""
+        state["current_step"] = "write"
+        query = state["research_query"]
+        report, title = await asyncio.gather(
+            self.writer.write_report(
+                query,
+                state["formatted_search"],
+                state["formatted_analysis"],
+                state["report_type"]
+            ),
+            self.writer.generate_title(query)
+        )
+        report["title"] = title
+        state["final_report"] = report
+
+        if report["status"] == "success":
+            state["messages"].append(("info", "✅ Report completed: %d words", (report["word_count"],)))
+        else:
+            state["error"] = report.get("error", "Unknown error")
+            state["messages"].append(("error", "❌ Report generation failed: %s", (state["error"],)))
+        _mark_step(state, "write")
+
+    async def _run_batch(self, requests: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Send chat completion requests through the Batch API and wait for them
+
+        Args:
+            requests: Request parameters keyed by a custom id
+
+        Returns:
+            For each custom id, {"content": ..., "tokens_used": ...} or {"error": ...}
+        """
+        client = self.openai_client
+
+        # One JSONL line per request
+        payload = b"\n".join(
+            orjson.dumps({
+                "custom_id": custom_id,
+                "method": "POST",
+                "url": "/v1/chat/completions",
+                "body": body
+            })
+            for custom_id, body in requests.items()
+        )
+
+        input_file = await client.files.create(file=("batch.jsonl", payload), purpose="batch")
+        batch = await client.batches.create(
+            input_file_id=input_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window="24h"
+        )
+        print(f"📦 Submitted batch {batch.id} with {len(requests)} requests")
+
+        while batch.status not in _TERMINAL_STATUSES:
+            await asyncio.sleep(POLL_INTERVAL)
+            batch = await client.batches.retrieve(batch.id)
+
+        if batch.status != "completed":
+            raise RuntimeError(f"batch {batch.id} ended with status {batch.status}")
+        print(f"✅ Batch {batch.id} completed")
+
+        outputs = {}
+        for file_id in (batch.output_file_id, batch.error_file_id):
+            if not file_id:
+                continue
+            content = await client.files.content(file_id)
+            for line in content.text.splitlines():
+                if not line.strip():
+                    continue
+                item = orjson.loads(line)
+                response = item.get("response") or {}
+                if item.get("error") or response.get("status_code") != 200:
+                    error = item.get("error") or response.get("body", {}).get("error")
+                    outputs[item["custom_id"]] = {"error": str(error)}
+                    continue
+                body = response["body"]
+                outputs[item["custom_id"]] = {
+                    "content": body["choices"][0]["message"]["content"],
+                    "tokens_used": body.get("usage", {}).get("total_tokens", 0)
+                }
+
+        # Requests the batch dropped without an error entry
+        for custom_id in requests:
+            outputs.setdefault(custom_id, {"error": "missing from batch output"})
+
+        return outputs
+
+
+# Example usage and testing
+if __name__ == "__main__":
+    """
+    Test the batch workflow
+    Run this file directly to test: python batch_research.py
+    """
+    print("🧪 Testing Batch Research Workflow\n")
+
+    test_queries = [
+        "What is machine learning?",
+        "How do transformer models work in NLP?",
+        "What are the latest breakthroughs in quantum computing?"
+    ]
+
+    async def main():
+        workflow = BatchResearchWorkflow()
+        results = await workflow.run_many(test_queries, report_type="summary")
+
+        for result in results:
+            query = result["metadata"]["query"]
+            if result["success"]:
+                print(f"\n✅ {query}: {result['metadata']['word_count']} words, "
+                      f"{result['metadata']['total_tokens']} tokens")
+            else:
+                print(f"\n❌ {query}: {result['error']}")
+
+    asyncio.run(main())
@@ -0,0 +1,125 @@
+# backend/workflow/profiler.py
+"""
+Lightweight profiler for the workflow nodes
+Records (node, duration, tokens, success) for every node call in a bounded
+buffer and summarizes them per node, to show whether time goes to search
+(network) or to the analyzer / writer (tokens).
+Enabled with RESEARCH_PROFILE=1; otherwise the decorator returns the node unchanged.
+"""
+
+from collections import deque
+from time import perf_counter
+from typing import Any, Awaitable, Callable, Deque, Dict, NamedTuple
+import functools
+import math
+import threading
+
+# Make the backend root importable when run directly
+import sys
+from pathlib import Path
+sys.path.append(str(Path(__file__).parent.parent))
+
+from config.settings import settings
+
+# Most recent calls kept per node
+RING_SIZE = 1000
+
+
+class NodeCall(NamedTuple):
+    """One recorded node call"""
+    duration: float
+    tokens: int
+    success: bool
+
+
+_lock = threading.Lock()
+_records: Dict[str, Deque[NodeCall]] = {}
+
+
+def _tokens_used(update: Dict[str, Any]) -> int:
+    """Tokens reported by the agents in a node's state update"""
+    return (
+        update.get("analysis", {}).get("tokens_used", 0) +
+        update.get("final_report", {}).get("tokens_used", 0)
+    )
+
+
+def record(node: str, duration: float, tokens: int, success: bool) -> None:
+    """Store one node call"""
+    with _lock:
+        calls = _records.get(node)
+        if calls is None:
+            calls = _records[node] = deque(maxlen=RING_SIZE)
+        calls.append(NodeCall(duration, tokens, success))
+
+
+def profile_node(func: Callable[..., Awaitable[Dict[str, Any]]]):
+    """
+    Decorator for async workflow nodes; the node name is the function name
+    without its "_node" suffix
+    """
+    if not settings.RESEARCH_PROFILE:
+        return func
+
+    name = func.__name__.removesuffix("_node")
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        start = perf_counter()
+        update = None
+        try:
+            update = await func(*args, **kwargs)
+            return update
+        finally:
+            duration = perf_counter() - start
+            if update is None:
+                record(name, duration, 0, False)
+            else:
+                record(name, duration, _tokens_used(update), not update.get("error"))
+
+    return wrapper
+
+
+def get_profile_report() -> Dict[str, Dict[str, Any]]:
+    """
+    Summarize the recorded calls
+
+    Returns:
+        For each node: calls, failures, min/avg/p95/max seconds and total tokens
+    """
+    with _lock:
+        snapshot = {node: list(calls) for node, calls in _records.items()}
+
+    report = {}
+    for node, calls in snapshot.items():
+        durations = sorted(call.duration for call in calls)
+        report[node] = {
+            "calls": len(calls),
+            "failures": sum(1 for call in calls if not call.success),
+            "min_s": round(durations[0], 3),
+            "avg_s": round(sum(durations) / len(durations), 3),
+            # Nearest-rank percentile
+            "p95_s": round(durations[math.ceil(0.95 * len(durations)) - 1], 3),
+            "max_s": round(durations[-1], 3),
+            "tokens": sum(call.tokens for call in calls)
+        }
+    return report
+
+
+def format_profile_report(report: Dict[str, Dict[str, Any]]) -> str:
+    """Render a profile report as a plain-text table"""
+    lines = [
+        f"{'node':<18}{'calls':>6}{'fail':>6}{'min':>8}{'avg':>8}{'p95':>8}{'max':>8}{'tokens':>9}"
+    ]
+    for node, row in report.items():
+        lines.append(
+            f"{node:<18}{row['calls']:>6}{row['failures']:>6}{row['min_s']:>8.2f}"
+            f"{row['avg_s']:>8.2f}{row['p95_s']:>8.2f}{row['max_s']:>8.2f}{row['tokens']:>9}"
+        )
+    return "\n".join(lines)
+
+
+def reset() -> None:
+    """Forget all recorded calls"""
+    with _lock:
+        _records.clear()
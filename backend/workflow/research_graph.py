@@ -4,13 +4,17 @@ LangGraph Orchestration: Coordinates the three agents in a stateful workflow
 This is the brain that manages how agents work together
 """
 
-from typing import Dict, TypedDict, Annotated, List, Any
+from typing import Dict, TypedDict, Annotated, List, Any, Callable, Deque, Iterable, Iterator, Optional, Set, Tuple
 from langgraph.graph import StateGraph, END
 from typing import List
-from langgraph.graph.message import add_messages
+from langgraph.config import get_stream_writer
+from langchain_core.runnables import RunnableConfig
 
+from collections import deque
 from datetime import datetime
-import json
+import asyncio
+import functools
+from time import perf_counter
 
 # Import our agents
 import sys
@@ -21,6 +25,96 @@ from agents.researcher import ResearcherAgent
 from agents.analyzer import AnalyzerAgent
 from agents.writer import WriterAgent
 from config.settings import settings
+from cache import result_disk_cache, semantic_cache
+from workflow.profiler import format_profile_report, get_profile_report, profile_node
+
+# Minimum query similarity for reusing a whole earlier research result;
+# lower than the per-agent threshold since it compares complete questions
+WORKFLOW_CACHE_THRESHOLD = 0.87
+
+# Follow-up prefetching (PREFETCH_RELATED): questions started per report,
+# background runs at once, and seconds each one may take
+PREFETCH_MAX_QUERIES = 3
+PREFETCH_CONCURRENCY = 2
+PREFETCH_TIMEOUT = 30
+
+# Called as on_progress(step, message, percent) while the workflow runs
+ProgressCallback = Callable[[str, str, float], None]
+
+# Called with each piece of report text as the Writer generates it
+ReportChunkCallback = Callable[[str], None]
+
+# Progress reported once a node finishes, i.e. when the next one starts
+_NEXT_STEP_PROGRESS = {
+    ("research", "detailed"): ("analyze", "🧠 Analyzing findings...", 35),
+    ("research", "fused"): ("analyze_and_write", "✍️ Analyzing and writing report...", 40),
+    ("analyze", "detailed"): ("write", "✍️ Writing report...", 70),
+}
+
+# Most workflow messages kept per run; older ones are dropped
+MAX_MESSAGES = 256
+
+# Workflow log entry: (level, %-style template, args). The text is only
+# built when the log is read, see format_message / iter_messages
+Message = Tuple[str, str, Tuple[Any, ...]]
+
+
+def format_message(message: Message) -> str:
+    """Render one workflow log entry"""
+    level, template, args = message
+    return template % args if args else template
+
+
+def _deque_extend(old: Deque[Message], new: Iterable[Message]) -> Deque[Message]:
+    """
+    Reducer for the messages channel: append a node's new messages to a
+    bounded copy of the log. The channel value must not be changed in place,
+    since LangGraph may apply the same writes to more than one copy of it.
+    """
+    messages = deque(old, maxlen=MAX_MESSAGES)
+    messages.extend(new)
+    return messages
+
+
+def _merge_step_status(old: Dict[str, str], new: Dict[str, str]) -> Dict[str, str]:
+    """Reducer for the step_status channel: each node adds its own entry"""
+    return {**old, **new}
+
+
+def _with_step_status(step: str, update: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Record in a node's update whether its step succeeded
+    
+    Args:
+        step: Node name ("research", "analyze", ...)
+        update: Fields returned by the node
+        
+    Returns:
+        The same update, with step_status set
+    """
+    update["step_status"] = {step: "error" if update.get("error") else "success"}
+    return update
+
+
+def merge_update(state: "ResearchState", update: Dict[str, Any]) -> "ResearchState":
+    """
+    Apply a node's state update outside the graph, the way LangGraph would
+    
+    Args:
+        state: State to update in place
+        update: Fields returned by a node
+        
+    Returns:
+        The updated state
+    """
+    for key, value in update.items():
+        if key == "messages":
+            state["messages"] = _deque_extend(state["messages"], value)
+        elif key == "step_status":
+            state["step_status"] = _merge_step_status(state.get("step_status", {}), value)
+        else:
+            state[key] = value
+    return state
 
 
 # Define the state structure that will be passed between agents
@@ -28,58 +122,216 @@ class ResearchState(TypedDict):
     """
     The shared state that flows through all agents.
     Think of this as a notebook that each agent reads and writes to.
+    Nodes return only the fields they change; messages are appended.
     """
-    messages: List[str]  # Conversation history
+    messages: Annotated[Deque[Message], _deque_extend]  # Workflow log (see format_message)
     research_query: str  # What we're researching
+    report_type: str  # "detailed", "summary", or "executive"
     search_results: Dict  # Results from Researcher
     analysis: Dict  # Analysis from Analyzer
     final_report: Dict  # Report from Writer
+    report_chunks: List[str]  # Report text as the Writer streamed it
+    formatted_search: str  # Search results formatted for the agents, built once
+    formatted_analysis: str  # Analysis formatted for the Writer, built once
     current_step: str  # Which step we're on
+    step_status: Annotated[Dict[str, str], _merge_step_status]  # "success" or "error" per finished step
     error: str  # Any errors that occur
 
 
+# Fields that start out the same in every run; new_research_state adds the
+# per-run values and fresh containers, so runs never share mutable state
+_EMPTY_STATE_TEMPLATE = {
+    "current_step": "initializing",
+    "error": "",
+    "formatted_search": "",
+    "formatted_analysis": ""
+}
+
+
+def new_research_state(query: str, report_type: str, log_start: bool = True) -> ResearchState:
+    """
+    Build the initial state for one run
+    
+    Args:
+        query: Research question
+        report_type: "detailed", "summary", or "executive"
+        log_start: Open the messages log with a "Starting research" entry
+        
+    Returns:
+        A new ResearchState
+    """
+    return {
+        **_EMPTY_STATE_TEMPLATE,
+        "messages": deque(
+            (("info", "Starting research for: %s", (query,)),) if log_start else (),
+            maxlen=MAX_MESSAGES
+        ),
+        "research_query": query,
+        "report_type": report_type,
+        "search_results": {},
+        "analysis": {},
+        "final_report": {},
+        "report_chunks": [],
+        "step_status": {}
+    }
+
+
+def _workflow(config: RunnableConfig) -> "ResearchWorkflow":
+    """The workflow instance a graph run was started by"""
+    return config["configurable"]["workflow"]
+
+
+# Graph nodes: thin wrappers that dispatch to the running workflow's methods,
+# so one compiled graph serves every instance (and subclass)
+async def _research(state: ResearchState, config: RunnableConfig) -> Dict[str, Any]:
+    return await _workflow(config).research_node(state)
+
+
+async def _analyze(state: ResearchState, config: RunnableConfig) -> Dict[str, Any]:
+    return await _workflow(config).analyze_node(state)
+
+
+async def _write(state: ResearchState, config: RunnableConfig) -> Dict[str, Any]:
+    return await _workflow(config).write_node(state)
+
+
+async def _analyze_and_write(state: ResearchState, config: RunnableConfig) -> Dict[str, Any]:
+    return await _workflow(config).analyze_and_write_node(state)
+
+
+def _route(state: ResearchState, config: RunnableConfig) -> str:
+    return _workflow(config)._route(state)
+
+
+def _after_analyze(state: ResearchState) -> str:
+    # A failed step ends the run here instead of every later node checking for it
+    return END if state.get("error") else "write"
+
+
+@functools.lru_cache(maxsize=1)
+def _compile_research_graph():
+    """
+    Build the LangGraph workflow that connects all agents, once per process.
+    This defines how data flows from one agent to another.
+    Runs must pass {"configurable": {"workflow": instance}} as their config.
+    """
+    # Create the state graph
+    workflow = StateGraph(ResearchState)
+    
+    # Add nodes (each node is an agent's action)
+    workflow.add_node("research", _research)
+    workflow.add_node("analyze", _analyze)
+    workflow.add_node("write", _write)
+    workflow.add_node("analyze_and_write", _analyze_and_write)
+    
+    # Define the flow (edges between nodes)
+    workflow.set_entry_point("research")  # Start with research
+    # Reports are analyzed and written in a single call; with fusing
+    # turned off, detailed reports keep separate analyze -> write steps.
+    # A failed step goes straight to END.
+    workflow.add_conditional_edges(
+        "research",
+        _route,
+        {"analyze": "analyze", "analyze_and_write": "analyze_and_write", END: END}
+    )
+    workflow.add_conditional_edges(
+        "analyze",
+        _after_analyze,
+        {"write": "write", END: END}
+    )
+    workflow.add_edge("write", END)  # Then finish
+    workflow.add_edge("analyze_and_write", END)
+    
+    # Compile the graph
+    return workflow.compile()
+
+
 class ResearchWorkflow:
     """
     Orchestrates the multi-agent research workflow using LangGraph.
     This class manages how the three agents collaborate.
+    Use ResearchWorkflow.shared() to get the process-wide instance.
     """
     
-    def __init__(self):
-        """Initialize the workflow with all three agents"""
+    # Process-wide instances created by shared(), one per (sub)class
+    _shared_instances: Dict[type, "ResearchWorkflow"] = {}
+    
+    @classmethod
+    def shared(cls, openai_client=None, tavily_client=None) -> "ResearchWorkflow":
+        """
+        Return the process-wide workflow, creating it on first use
+        The agents and their HTTP connection pools are then set up once
+        per process instead of once per caller
+        
+        Args:
+            openai_client: AsyncOpenAI client, used only when creating the instance
+            tavily_client: AsyncTavilyClient, used only when creating the instance
+            
+        Returns:
+            The shared workflow instance
+        """
+        instance = cls._shared_instances.get(cls)
+        if instance is None:
+            instance = cls(openai_client=openai_client, tavily_client=tavily_client)
+            cls._shared_instances[cls] = instance
+        return instance
+    
+    def __init__(self, openai_client=None, tavily_client=None, fused: Optional[bool] = None):
+        """
+        Initialize the workflow with all three agents
+        
+        Args:
+            openai_client: AsyncOpenAI client for the Analyzer and Writer
+                (the process-wide pooled client if omitted)
+            tavily_client: AsyncTavilyClient for the Researcher (created if omitted)
+            fused: Analyze and write every report type in a single OpenAI call
+                (settings.FUSED_ANALYZE_WRITE if omitted)
+        """
         print("🚀 Initializing Research Workflow...")
         
         # Initialize agents
-        self.researcher = ResearcherAgent(settings.TAVILY_API_KEY)
-        self.analyzer = AnalyzerAgent(settings.OPENAI_API_KEY, settings.OPENAI_MODEL)
-        self.writer = WriterAgent(settings.OPENAI_API_KEY, settings.OPENAI_MODEL)
+        self.researcher = ResearcherAgent(settings.TAVILY_API_KEY, async_client=tavily_client)
+        # Analyzer and Writer share one pooled OpenAI client
+        if openai_client is None:
+            # Imported here so loading this module doesn't pull in the SDK
+            from agents._client import client as openai_client
+        self.openai_client = openai_client
+        self.fused = settings.FUSED_ANALYZE_WRITE if fused is None else fused
+        self.analyzer = AnalyzerAgent(
+            settings.OPENAI_API_KEY, settings.OPENAI_MODEL, client=openai_client
+        )
+        self.writer = WriterAgent(
+            settings.OPENAI_API_KEY, settings.OPENAI_MODEL, client=openai_client
+        )
         
-        # Build the workflow graph
-        self.app = self._build_graph()
+        # Dedicated event loop for the blocking run() entry point, so the
+        # agents' async clients always stay on the same loop; created by the
+        # first run() call (the server only uses arun) and closed by close()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        
+        # Tells the shared graph's nodes which instance they run for
+        self.run_config: RunnableConfig = {"configurable": {"workflow": self}}
+        
+        # Background follow-up runs; references are kept until they finish
+        self._prefetch_semaphore = asyncio.Semaphore(PREFETCH_CONCURRENCY)
+        self._prefetch_tasks: Set[asyncio.Task] = set()
         print("✅ Workflow initialized successfully!")
     
-    def _build_graph(self) -> StateGraph:
-        """
-        Build the LangGraph workflow that connects all agents.
-        This defines how data flows from one agent to another.
-        """
-        # Create the state graph
-        workflow = StateGraph(ResearchState)
-        
-        # Add nodes (each node is an agent's action)
-        workflow.add_node("research", self.research_node)
-        workflow.add_node("analyze", self.analyze_node)
-        workflow.add_node("write", self.write_node)
-        
-        # Define the flow (edges between nodes)
-        workflow.set_entry_point("research")  # Start with research
-        workflow.add_edge("research", "analyze")  # Then analyze
-        workflow.add_edge("analyze", "write")  # Then write
-        workflow.add_edge("write", END)  # Then finish
-        
-        # Compile the graph
-        return workflow.compile()
+    @property
+    def app(self):
+        """The compiled workflow graph, shared by every instance"""
+        return _compile_research_graph()
+    
+    def _route(self, state: ResearchState) -> str:
+        """Pick the step that follows research (analyze, analyze_and_write or END)"""
+        if state.get("error"):
+            return END
+        if state["report_type"] == "detailed" and not self.fused:
+            return "analyze"
+        return "analyze_and_write"
     
-    def research_node(self, state: ResearchState) -> ResearchState:
+    @profile_node
+    async def research_node(self, state: ResearchState) -> Dict[str, Any]:
         """
         Research node: Uses the Researcher agent to search for information
         
@@ -87,37 +339,38 @@ class ResearchWorkflow:
             state: Current workflow state
             
         Returns:
-            Updated state with search results
+            State update with search results
         """
         print("\n📍 Step 1: Research Node Activated")
-        state["current_step"] = "research"
+        update = {"current_step": "research", "messages": []}
         
         try:
             # Get the research query
             query = state["research_query"]
-            state["messages"].append(f"Researching: {query}")
+            update["messages"].append(("info", "Researching: %s", (query,)))
             
             # Perform the search
-            search_results = self.researcher.search(query, max_results=5)
+            search_results = await self.researcher.asearch(query, max_results=5)
             
             # Store results in state
-            state["search_results"] = search_results
+            update["search_results"] = search_results
             
             if search_results["status"] == "success":
-                state["messages"].append(
-                    f"✅ Found {len(search_results['results']['sources'])} sources"
+                update["messages"].append(
+                    ("info", "✅ Found %d sources", (len(search_results["results"]["sources"]),))
                 )
             else:
-                state["error"] = search_results.get("error", "Unknown error")
-                state["messages"].append(f"❌ Research failed: {state['error']}")
+                update["error"] = search_results.get("error", "Unknown error")
+                update["messages"].append(("error", "❌ Research failed: %s", (update["error"],)))
             
         except Exception as e:
-            state["error"] = str(e)
-            state["messages"].append(f"❌ Research node error: {e}")
+            update["error"] = str(e)
+            update["messages"].append(("error", "❌ Research node error: %s", (update["error"],)))
         
-        return state
+        return _with_step_status("research", update)
     
-    def analyze_node(self, state: ResearchState) -> ResearchState:
+    @profile_node
+    async def analyze_node(self, state: ResearchState) -> Dict[str, Any]:
         """
         Analysis node: Uses the Analyzer agent to synthesize findings
         
@@ -125,103 +378,223 @@ class ResearchWorkflow:
             state: Current workflow state with search results
             
         Returns:
-            Updated state with analysis
+            State update with analysis
         """
         print("\n📍 Step 2: Analysis Node Activated")
-        state["current_step"] = "analyze"
+        update = {"current_step": "analyze", "messages": []}
         
         try:
-            # Check if we have search results
-            if state.get("search_results", {}).get("status") != "success":
-                state["error"] = "No search results to analyze"
-                state["messages"].append("❌ Skipping analysis: No search results")
-                return state
-            
-            # Format search results for analyzer
+            # Format search results for analyzer (kept for the Writer)
             formatted_results = self.researcher.format_for_next_agent(
                 state["search_results"]
             )
+            update["formatted_search"] = formatted_results
             
             # Perform analysis
-            analysis = self.analyzer.analyze(
+            analysis = await self.analyzer.analyze(
                 formatted_results,
                 state["research_query"]
             )
             
             # Store analysis in state
-            state["analysis"] = analysis
+            update["analysis"] = analysis
             
             if analysis["status"] == "success":
-                state["messages"].append("✅ Analysis completed successfully")
+                update["formatted_analysis"] = self.analyzer.format_for_next_agent(analysis)
+                update["messages"].append(("info", "✅ Analysis completed successfully", ()))
             else:
-                state["error"] = analysis.get("error", "Unknown error")
-                state["messages"].append(f"❌ Analysis failed: {state['error']}")
+                update["error"] = analysis.get("error", "Unknown error")
+                update["messages"].append(("error", "❌ Analysis failed: %s", (update["error"],)))
             
         except Exception as e:
-            state["error"] = str(e)
-            state["messages"].append(f"❌ Analysis node error: {e}")
+            update["error"] = str(e)
+            update["messages"].append(("error", "❌ Analysis node error: %s", (update["error"],)))
         
-        return state
+        return _with_step_status("analyze", update)
     
-    def write_node(self, state: ResearchState) -> ResearchState:
+    @profile_node
+    async def write_node(self, state: ResearchState) -> Dict[str, Any]:
         """
         Writing node: Uses the Writer agent to create the final report
+        The report is streamed; each chunk is emitted on LangGraph's "custom"
+        stream as {"chunk": text} while it is being written
         
         Args:
             state: Current workflow state with analysis
             
         Returns:
-            Updated state with final report
+            State update with final report
         """
         print("\n📍 Step 3: Writing Node Activated")
-        state["current_step"] = "write"
+        update = {"current_step": "write", "messages": []}
         
         try:
-            # Check if we have analysis results
-            if state.get("analysis", {}).get("status") != "success":
-                state["error"] = "No analysis to write report from"
-                state["messages"].append("❌ Skipping report: No analysis")
-                return state
-            
-            # Format inputs for writer
-            formatted_search = self.researcher.format_for_next_agent(
+            # Format inputs for writer, reusing what the analyze step built
+            formatted_search = state.get("formatted_search") or self.researcher.format_for_next_agent(
                 state["search_results"]
             )
-            formatted_analysis = self.analyzer.format_for_next_agent(
+            formatted_analysis = state.get("formatted_analysis") or self.analyzer.format_for_next_agent(
                 state["analysis"]
             )
             
-            # Generate report
-            report = self.writer.write_report(
+            # No-op unless the graph is streamed with the "custom" mode
+            stream_writer = get_stream_writer()
+            chunks = update["report_chunks"] = []
+            
+            def on_chunk(chunk: str):
+                chunks.append(chunk)
+                stream_writer({"chunk": chunk})
+            
+            # Generate report and title concurrently
+            report, title = await asyncio.gather(
+                self.writer.write_report(
+                    query=state["research_query"],
+                    search_results=formatted_search,
+                    analysis=formatted_analysis,
+                    report_type=state["report_type"],
+                    on_chunk=on_chunk
+                ),
+                self.writer.generate_title(state["research_query"])
+            )
+            report["title"] = title
+            
+            # Store report in state
+            update["final_report"] = report
+            
+            if report["status"] == "success":
+                update["messages"].append(
+                    ("info", "✅ Report completed: %d words", (report["word_count"],))
+                )
+            else:
+                update["error"] = report.get("error", "Unknown error")
+                update["messages"].append(("error", "❌ Report generation failed: %s", (update["error"],)))
+            
+        except Exception as e:
+            update["error"] = str(e)
+            update["messages"].append(("error", "❌ Writing node error: %s", (update["error"],)))
+        
+        return _with_step_status("write", update)
+    
+    @profile_node
+    async def analyze_and_write_node(self, state: ResearchState) -> Dict[str, Any]:
+        """
+        Fused node: analyzes the findings and writes the report in one call
+        The report part of the response is streamed like write_node's, as
+        {"chunk": text} on LangGraph's "custom" stream
+        
+        Args:
+            state: Current workflow state with search results
+            
+        Returns:
+            State update with analysis and final report
+        """
+        print("\n📍 Step 2: Analyze & Write Node Activated")
+        update = {"current_step": "analyze_and_write", "messages": []}
+        
+        try:
+            formatted_results = self.researcher.format_for_next_agent(
+                state["search_results"]
+            )
+            
+            # No-op unless the graph is streamed with the "custom" mode
+            stream_writer = get_stream_writer()
+            chunks = update["report_chunks"] = []
+            
+            def on_chunk(chunk: str):
+                chunks.append(chunk)
+                stream_writer({"chunk": chunk})
+            
+            report = await self.writer.analyze_and_write(
                 query=state["research_query"],
-                search_results=formatted_search,
-                analysis=formatted_analysis,
-                report_type="detailed"
+                search_results=formatted_results,
+                report_type=state["report_type"],
+                on_chunk=on_chunk
             )
             
             # Store report in state
-            state["final_report"] = report
+            update["final_report"] = report
             
             if report["status"] == "success":
-                state["messages"].append(
-                    f"✅ Report completed: {report['word_count']} words"
+                # Tokens are counted once, on the report
+                update["analysis"] = {
+                    "status": "success",
+                    "original_query": state["research_query"],
+                    "analysis": report["analysis"],
+                    "key_points": report["key_points"],
+                    "agent": report["agent"],
+                    "tokens_used": 0
+                }
+                update["messages"].append(
+                    ("info", "✅ Analysis and report completed: %d words", (report["word_count"],))
                 )
             else:
-                state["error"] = report.get("error", "Unknown error")
-                state["messages"].append(f"❌ Report generation failed: {state['error']}")
+                update["error"] = report.get("error", "Unknown error")
+                update["messages"].append(("error", "❌ Report generation failed: %s", (update["error"],)))
             
         except Exception as e:
-            state["error"] = str(e)
-            state["messages"].append(f"❌ Writing node error: {e}")
+            update["error"] = str(e)
+            update["messages"].append(("error", "❌ Analyze & write node error: %s", (update["error"],)))
+        
+        return _with_step_status("analyze_and_write", update)
+    
+    def run(self, query: str, report_type: str = "detailed",
+            on_progress: Optional[ProgressCallback] = None,
+            on_report_chunk: Optional[ReportChunkCallback] = None) -> Dict[str, Any]:
+        """
+        Run the complete research workflow (blocking)
+        Use arun from async code such as the FastAPI handlers
+        
+        Args:
+            query: Research question to investigate
+            report_type: "detailed", "summary", or "executive"
+            on_progress: Optional callback invoked as each step starts
+            on_report_chunk: Optional callback receiving the report as it is written
+            
+        Returns:
+            Dictionary with the final report and metadata
+        """
+        # The dedicated loop can't be driven from inside another running loop
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            pass
+        else:
+            raise RuntimeError("run() can't be called from a running event loop; await arun() instead")
         
-        return state
+        if self._loop is None or self._loop.is_closed():
+            self._loop = asyncio.new_event_loop()
+        return self._loop.run_until_complete(
+            self.arun(query, report_type, on_progress, on_report_chunk)
+        )
+    
+    def close(self):
+        """Close the event loop used by run(), if one was created"""
+        if self._loop is not None and not self._loop.is_closed():
+            self._loop.close()
+        self._loop = None
     
-    def run(self, query: str) -> Dict[str, Any]:
+    def __del__(self):
+        # getattr: __init__ may have failed before the loop attribute was set
+        if getattr(self, "_loop", None) is not None:
+            self.close()
+    
+    async def arun(self, query: str, report_type: str = "detailed",
+                   on_progress: Optional[ProgressCallback] = None,
+                   on_report_chunk: Optional[ReportChunkCallback] = None,
+                   prefetch: bool = False) -> Dict[str, Any]:
         """
         Run the complete research workflow
         
         Args:
             query: Research question to investigate
+            report_type: "detailed", "summary", or "executive"
+            on_progress: Optional callback invoked as on_progress(step, message,
+                percent) when each step starts; called on the running event loop
+            on_report_chunk: Optional callback receiving each chunk of report text
+                as the Writer streams it, on both the separate write step and the
+                single-call analyze & write path (a cached report arrives in one piece)
+            prefetch: Set for background follow-up runs; they only fill the
+                caches and never start prefetches of their own
             
         Returns:
             Dictionary with the final report and metadata
@@ -231,60 +604,60 @@ class ResearchWorkflow:
         print(f"📝 Query: {query}")
         print(f"{'='*60}")
         
+        # The exact same query was answered before (survives restarts)
+        if result_disk_cache is not None:
+            cached = await result_disk_cache.get(query, report_type)
+            if cached is not None:
+                print("\n✅ WORKFLOW SERVED FROM DISK CACHE")
+                return {**cached, "metadata": {**cached["metadata"], "cache_hit": True}}
+        
+        # A paraphrase of an earlier query reuses that whole result
+        namespace = f"workflow:{report_type}"
+        query_embedding = await semantic_cache.embed(self.openai_client, query)
+        if query_embedding is not None:
+            cached = semantic_cache.lookup(
+                namespace, query_embedding, threshold=WORKFLOW_CACHE_THRESHOLD
+            )
+            if cached is not None:
+                print(f"\n✅ WORKFLOW SERVED FROM SEMANTIC CACHE (asked as: {cached['metadata']['query']})")
+                return {
+                    **cached,
+                    "metadata": {**cached["metadata"], "query": query, "cache_hit": True}
+                }
+        
         # Initialize state
-        initial_state = {
-            "messages": [f"Starting research for: {query}"],
-            "research_query": query,
-            "search_results": {},
-            "analysis": {},
-            "final_report": {},
-            "current_step": "initializing",
-            "error": ""
-        }
+        initial_state = new_research_state(query, report_type)
         
         try:
             # Run the workflow
-            start_time = datetime.now()
-            final_state = self.app.invoke(initial_state)
-            end_time = datetime.now()
-            duration = (end_time - start_time).total_seconds()
-            
-            # Prepare results
-            if final_state.get("final_report", {}).get("status") == "success":
-                print(f"\n✅ WORKFLOW COMPLETED SUCCESSFULLY in {duration:.1f} seconds")
-                
-                return {
-                    "success": True,
-                    "report": final_state["final_report"]["report"],
-                    "metadata": {
-                        "query": query,
-                        "duration_seconds": duration,
-                        "sources_found": len(
-                            final_state.get("search_results", {})
-                            .get("results", {})
-                            .get("sources", [])
-                        ),
-                        "word_count": final_state["final_report"].get("word_count", 0),
-                        "total_tokens": (
-                            final_state.get("analysis", {}).get("tokens_used", 0) +
-                            final_state.get("final_report", {}).get("tokens_used", 0)
-                        ),
-                        "workflow_steps": final_state["messages"]
-                    }
-                }
+            start_time = perf_counter()
+            if on_progress is None and on_report_chunk is None:
+                final_state = await self.app.ainvoke(initial_state, config=self.run_config)
             else:
-                print(f"\n❌ WORKFLOW FAILED: {final_state.get('error', 'Unknown error')}")
-                
-                return {
-                    "success": False,
-                    "error": final_state.get("error", "Workflow failed"),
-                    "metadata": {
-                        "query": query,
-                        "duration_seconds": duration,
-                        "failed_at_step": final_state.get("current_step", "unknown"),
-                        "workflow_steps": final_state["messages"]
-                    }
-                }
+                final_state = await self._run_with_callbacks(
+                    initial_state, on_progress, on_report_chunk
+                )
+            duration = perf_counter() - start_time
+            
+            result = self._build_result(query, report_type, final_state, duration)
+            if result["success"]:
+                if query_embedding is not None:
+                    semantic_cache.insert(namespace, query_embedding, result)
+                if result_disk_cache is not None:
+                    await result_disk_cache.set(query, report_type, result)
+                # Not from run(): its loop stops when the call returns, and
+                # the prefetch tasks would never get to run
+                if (settings.PREFETCH_RELATED and not prefetch and
+                        asyncio.get_running_loop() is not self._loop):
+                    self.prefetch_related(final_state)
+            
+            if settings.RESEARCH_PROFILE:
+                # Added after caching, so cached results don't carry stale timings
+                profile = self.get_profile_report()
+                print(f"\n⏱️ NODE PROFILE\n{format_profile_report(profile)}")
+                result = {**result, "metadata": {**result["metadata"], "profile": profile}}
+            
+            return result
                 
         except Exception as e:
             print(f"\n❌ WORKFLOW EXCEPTION: {str(e)}")
@@ -298,42 +671,267 @@ class ResearchWorkflow:
                 }
             }
     
-    def run_with_streaming(self, query: str):
+    def _build_result(self, query: str, report_type: str,
+                      final_state: ResearchState, duration: float) -> Dict[str, Any]:
+        """
+        Turn a finished workflow state into the result returned by arun
+        
+        Returns:
+            Dictionary with the final report and metadata, or the error
+        """
+        if final_state.get("final_report", {}).get("status") == "success":
+            print(f"\n✅ WORKFLOW COMPLETED SUCCESSFULLY in {duration:.1f} seconds")
+            
+            return {
+                "success": True,
+                "report": final_state["final_report"]["report"],
+                "metadata": {
+                    "query": query,
+                    "title": final_state["final_report"].get("title", ""),
+                    "report_type": report_type,
+                    "duration_seconds": duration,
+                    "sources_found": len(
+                        final_state.get("search_results", {})
+                        .get("results", {})
+                        .get("sources", [])
+                    ),
+                    "word_count": final_state["final_report"].get("word_count", 0),
+                    "total_tokens": (
+                        final_state.get("analysis", {}).get("tokens_used", 0) +
+                        final_state.get("final_report", {}).get("tokens_used", 0)
+                    ),
+                    "step_status": dict(final_state.get("step_status", {})),
+                    "workflow_steps": list(self.iter_messages(final_state))
+                }
+            }
+        else:
+            print(f"\n❌ WORKFLOW FAILED: {final_state.get('error', 'Unknown error')}")
+            
+            return {
+                "success": False,
+                "error": final_state.get("error", "Workflow failed"),
+                "metadata": {
+                    "query": query,
+                    "duration_seconds": duration,
+                    "failed_at_step": final_state.get("current_step", "unknown"),
+                    "step_status": dict(final_state.get("step_status", {})),
+                    "workflow_steps": list(self.iter_messages(final_state))
+                }
+            }
+    
+    def prefetch_related(self, state: ResearchState) -> List[asyncio.Task]:
+        """
+        Research likely follow-up questions in the background, so they are
+        already cached when the user asks them
+        The candidates are the analysis' key points; at most
+        PREFETCH_CONCURRENCY run at once, each limited to PREFETCH_TIMEOUT seconds.
+        Must be called on an event loop that keeps running (e.g. the server's)
+        
+        Args:
+            state: Final state of a successful run
+            
+        Returns:
+            The started tasks (fire-and-forget; nothing needs to await them)
+        """
+        seen = {state["research_query"].strip().lower()}
+        queries = []
+        for point in state.get("analysis", {}).get("key_points", []):
+            query = point.strip(" -•*")
+            if query and query.lower() not in seen:
+                seen.add(query.lower())
+                queries.append(query)
+            if len(queries) >= PREFETCH_MAX_QUERIES:
+                break
+        
+        tasks = []
+        for query in queries:
+            task = asyncio.create_task(self._prefetch(query, state["report_type"]))
+            self._prefetch_tasks.add(task)
+            task.add_done_callback(self._prefetch_done)
+            tasks.append(task)
+        
+        if tasks:
+            print(f"🔮 Prefetching {len(tasks)} follow-up queries")
+        return tasks
+    
+    def _prefetch_done(self, task: asyncio.Task):
+        """Forget a finished prefetch task, reporting how it failed if it did"""
+        self._prefetch_tasks.discard(task)
+        if task.cancelled():
+            print("⏹️ Prefetch cancelled")
+        elif task.exception() is not None:
+            print(f"❌ Prefetch failed: {task.exception()}")
+    
+    async def _prefetch(self, query: str, report_type: str):
+        """Run one follow-up query for its cache side effects"""
+        async with self._prefetch_semaphore:
+            try:
+                await asyncio.wait_for(
+                    self.arun(query, report_type, prefetch=True),
+                    timeout=PREFETCH_TIMEOUT
+                )
+            except asyncio.TimeoutError:
+                print(f"⏱️ Prefetch timed out after {PREFETCH_TIMEOUT}s: {query}")
+            except Exception as e:
+                print(f"❌ Prefetch failed: {e}")
+    
+    @staticmethod
+    def iter_messages(state: ResearchState) -> Iterator[str]:
+        """
+        Render a state's workflow log, one line per entry
+        
+        Args:
+            state: Workflow state
+            
+        Yields:
+            Formatted messages, oldest first
+        """
+        for message in state["messages"]:
+            yield format_message(message)
+    
+    def get_profile_report(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Per-node timing and token totals recorded so far (RESEARCH_PROFILE=1)
+        
+        Returns:
+            For each node: calls, failures, min/avg/p95/max seconds and tokens
+        """
+        return get_profile_report()
+    
+    async def _run_with_callbacks(self, initial_state: ResearchState,
+                                  on_progress: Optional[ProgressCallback],
+                                  on_report_chunk: Optional[ReportChunkCallback]) -> ResearchState:
+        """
+        Run the graph, reporting each step to on_progress as it actually starts
+        and each streamed piece of the report to on_report_chunk
+        
+        Returns:
+            The final workflow state
+        """
+        if on_progress is not None:
+            on_progress("research", "🔍 Searching for information...", 10)
+        
+        route = "detailed" if self._route(initial_state) == "analyze" else "fused"
+        final_state = initial_state
+        async for mode, payload in self.app.astream(
+            initial_state, config=self.run_config, stream_mode=["updates", "custom", "values"]
+        ):
+            if mode == "values":
+                final_state = payload
+            elif mode == "custom":
+                if on_report_chunk is not None:
+                    on_report_chunk(payload["chunk"])
+            else:
+                for node, update in payload.items():
+                    next_step = _NEXT_STEP_PROGRESS.get((node, route))
+                    if on_progress is not None and next_step and not update.get("error"):
+                        on_progress(*next_step)
+        
+        return final_state
+    
+    async def run_with_streaming(self, query: str, report_type: str = "detailed"):
         """
         Run workflow with streaming updates (for real-time UI updates)
-        Yields status updates as the workflow progresses
+        Yields status updates as the workflow progresses, and
+        {"step": "write", "chunk": text} events while the report is written
         """
         print(f"\n🔄 Starting streaming workflow for: {query}")
         
         # Initialize state
-        initial_state = {
-            "messages": [],
-            "research_query": query,
-            "search_results": {},
-            "analysis": {},
-            "final_report": {},
-            "current_step": "initializing",
-            "error": ""
-        }
+        initial_state = new_research_state(query, report_type, log_start=False)
         
         # Stream updates as the workflow runs
-        for output in self.app.stream(initial_state):
-            # Yield status updates for each step
-            for key, value in output.items():
+        final_state = initial_state
+        async for mode, payload in self.app.astream(
+            initial_state, config=self.run_config, stream_mode=["updates", "custom", "values"]
+        ):
+            if mode == "values":
+                final_state = payload
+                continue
+            if mode == "custom":
+                yield {"step": "write", "chunk": payload["chunk"]}
+                continue
+            
+            # Yield status updates for each step, with the messages it added
+            for key, value in payload.items():
                 yield {
                     "step": key,
                     "status": "running",
                     "current_step": value.get("current_step", "unknown"),
-                    "messages": value.get("messages", [])
+                    "messages": [format_message(message) for message in value.get("messages", [])]
                 }
         
         # Yield final result
         yield {
             "step": "complete",
             "status": "finished",
-            "report": output.get("final_report", {}).get("report", "")
+            "report": final_state.get("final_report", {}).get("report", "")
         }
 
+    
+    async def stream_report(self, query: str, report_type: str = "detailed"):
+        """
+        Run research and analysis, then stream the report as it is written
+        Yields events: "report_chunk" with text, then "complete" with metadata,
+        or a single "error" event if an earlier step fails
+        """
+        print(f"\n🔄 Starting report stream for: {query}")
+        
+        state = new_research_state(query, report_type)
+        
+        start_time = perf_counter()
+        
+        merge_update(state, await self.research_node(state))
+        if not state["error"]:
+            merge_update(state, await self.analyze_node(state))
+        
+        if state["error"]:
+            yield {
+                "type": "error",
+                "error": state.get("error") or "Analysis failed",
+                "failed_at_step": state["current_step"]
+            }
+            return
+        
+        state["current_step"] = "write"
+        # Built by the analyze step
+        formatted_search = state["formatted_search"]
+        formatted_analysis = state["formatted_analysis"]
+        
+        parts = []
+        try:
+            async for chunk in self.writer.stream_report(
+                query, formatted_search, formatted_analysis, report_type
+            ):
+                parts.append(chunk)
+                yield {"type": "report_chunk", "data": chunk}
+        except Exception as e:
+            yield {
+                "type": "error",
+                "error": f"Report generation failed: {str(e)}",
+                "failed_at_step": "write"
+            }
+            return
+        
+        report = "".join(parts)
+        duration = perf_counter() - start_time
+        word_count = len(report.split())
+        state["messages"].append(("info", "✅ Report completed: %d words", (word_count,)))
+        
+        yield {
+            "type": "complete",
+            "report": report,
+            "metadata": {
+                "query": query,
+                "duration_seconds": duration,
+                "sources_found": len(
+                    state["search_results"].get("results", {}).get("sources", [])
+                ),
+                "word_count": word_count,
+                "total_tokens": state["analysis"].get("tokens_used", 0),
+                "workflow_steps": list(self.iter_messages(state))
+            }
+        }
 
 # Example usage and testing
 if __name__ == "__main__":